@@ -0,0 +1,68 @@
+"""Measure how long a capture burst blocks the caller with CaptureWriter.
+
+A burst of screen-sized crops is submitted back to back, the way repeated
+Ctrl+Clicks reach the capture handler, and compared with writing the same
+images synchronously with cv2.imwrite.
+
+    python benchmarks/bench_capture_writer.py --captures 100 --size 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capture_writer import CaptureWriter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--captures', type=int, default=100)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--format', choices=('png', 'raw'), default='png')
+    parser.add_argument('--compression', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [cv2.GaussianBlur(rng.integers(0, 255, (args.size, args.size, 3), np.uint8),
+                               (9, 9), 0) for _ in range(args.captures)]
+
+    sync_dir = tempfile.mkdtemp()
+    start = time.perf_counter()
+    for i, image in enumerate(images):
+        cv2.imwrite(os.path.join(sync_dir, f'capture_{i}.png'), image,
+                    [cv2.IMWRITE_PNG_COMPRESSION, args.compression])
+    sync_time = time.perf_counter() - start
+
+    async_dir = tempfile.mkdtemp()
+    writer = CaptureWriter(async_dir, workers=args.workers, image_format=args.format,
+                           compression=args.compression)
+    blocked = []
+    start = time.perf_counter()
+    for image in images:
+        submitted = time.perf_counter()
+        writer.submit(image)
+        blocked.append(time.perf_counter() - submitted)
+    submit_time = time.perf_counter() - start
+    writer.flush()
+    total_time = time.perf_counter() - start
+    writer.close()
+
+    stats = writer.stats()
+    on_disk = len(os.listdir(async_dir))
+    print(f"synchronous imwrite: {sync_time * 1000:.1f} ms for {args.captures} captures "
+          f"({sync_time / args.captures * 1000:.2f} ms blocked per capture)")
+    print(f"CaptureWriter: {submit_time * 1000:.1f} ms to queue, {total_time * 1000:.1f} ms "
+          f"until written ({max(blocked) * 1000:.3f} ms max blocked per capture)")
+    print(f"written {stats['written']}, failed {stats['failed']}, files on disk {on_disk}, "
+          f"{stats['bytes'] / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Time pixel-color assertions and color search on a 1080p frame.
+
+    python benchmarks/bench_color_checks.py --checks 48 --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from color_checks import PixelChecks, find_color
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=48)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 200, (1080, 1920, 3), np.uint8)
+    # A distinct button-colored blob plus a few stray pixels of the same color
+    cv2.rectangle(frame, (1400, 800), (1480, 830), (40, 120, 250), -1)
+    for x, y in rng.integers(0, 1080, (20, 2)):
+        frame[y, x] = (40, 120, 250)
+
+    points = rng.integers(0, 1080, (args.checks, 2))
+    checks = PixelChecks([{'x': int(x), 'y': int(y),
+                           'color': '#%02x%02x%02x' % tuple(frame[y, x][::-1])}
+                          for x, y in points])
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        failures = checks.evaluate(frame)
+    check_time = (time.perf_counter() - start) / args.repeat
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        match = find_color(frame, (250, 120, 40), tolerance=5)
+    find_time = (time.perf_counter() - start) / args.repeat
+
+    print(f"{len(checks)} pixel checks: {check_time * 1000:.3f} ms per frame, "
+          f"{len(failures)} failed")
+    print(f"color search: {find_time * 1000:.2f} ms per frame, centroid "
+          f"({match.x}, {match.y}) from {match.pixels} pixels")
+
+
+if __name__ == "__main__":
+    main()
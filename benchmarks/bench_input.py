@@ -0,0 +1,78 @@
+"""Measure input events per second for each input backend.
+
+The same mix of pointer moves and Shift presses is sent through every
+backend that can run here: the in-memory recorder always, pyautogui and
+XTEST when a display is available. Clicks are only added with --clicks,
+best used on a throwaway display such as Xvfb. pyautogui is measured with
+its stock 0.1 s PAUSE and with the pacing the backend layer uses instead.
+
+    python benchmarks/bench_input.py --calls 2000
+    DISPLAY=:99 python benchmarks/bench_input.py --clicks
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_backend import PyAutoGUIBackend, RecordingBackend, XTestBackend
+
+
+def drive(backend, calls, clicks=False):
+    """Send ``calls`` input calls and return (seconds, events sent)"""
+    start_events = backend.events
+    start = time.perf_counter()
+    for i in range(calls):
+        kind = i % 3
+        if kind == 0:
+            backend.move(100 + i % 200, 100 + i % 150)
+        elif kind == 1 and clicks:
+            backend.click()
+        else:
+            backend.press('shift')
+    backend.flush()
+    return time.perf_counter() - start, backend.events - start_events
+
+
+def report(name, calls, elapsed, events):
+    print(f"{name:<24} {calls / elapsed:>12,.0f} calls/s {events / elapsed:>12,.0f} events/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--clicks', action='store_true',
+                        help="include left clicks in the event mix")
+    parser.add_argument('--stock-calls', type=int, default=20,
+                        help="calls for pyautogui with its default PAUSE")
+    args = parser.parse_args()
+
+    report('record', args.calls, *drive(RecordingBackend(), args.calls, args.clicks))
+
+    try:
+        backend = PyAutoGUIBackend()
+    except Exception as e:
+        print(f"{'pyautogui':<24} skipped: {e}")
+    else:
+        report('pyautogui (pace 0)', args.calls, *drive(backend, args.calls, args.clicks))
+        backend.pyautogui.PAUSE = 0.1
+        stock = backend.pyautogui
+        start = time.perf_counter()
+        for i in range(args.stock_calls):
+            stock.press('shift')
+        report('pyautogui (PAUSE 0.1)', args.stock_calls, time.perf_counter() - start,
+               2 * args.stock_calls)
+        stock.PAUSE = 0
+
+    try:
+        backend = XTestBackend()
+    except Exception as e:
+        print(f"{'xtest':<24} skipped: {e}")
+    else:
+        report('xtest', args.calls, *drive(backend, args.calls, args.clicks))
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
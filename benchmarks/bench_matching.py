@@ -0,0 +1,96 @@
+"""Benchmark the pyramid matcher against the full-resolution locate path.
+
+Builds a synthetic "desktop" screenshot, crops a few reference buttons out
+of it and times how long each engine takes to find them again.
+
+    python benchmarks/bench_matching.py --width 3840 --height 2160
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_matcher import PyramidMatcher
+
+
+def synthetic_screenshot(width, height, seed=0):
+    """Draw a busy UI-like screen: panels, buttons, text and a little noise"""
+    rng = np.random.default_rng(seed)
+    screen = np.full((height, width, 3), 40, dtype=np.uint8)
+    for _ in range(width * height // 20000):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 20))
+        w, h = int(rng.integers(20, 240)), int(rng.integers(12, 80))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), color, -1)
+    for _ in range(width * height // 40000):
+        x, y = int(rng.integers(0, width - 100)), int(rng.integers(10, height))
+        cv2.putText(screen, f"Item {int(rng.integers(1000))}", (x, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (230, 230, 230), 1)
+    noise = rng.integers(-4, 5, screen.shape)
+    return np.clip(screen.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def full_resolution_locate(haystack, needle, confidence):
+    """The current playback path: pyscreeze when available, else raw OpenCV"""
+    try:
+        import pyscreeze
+        return pyscreeze.locate(needle, haystack, confidence=confidence)
+    except ImportError:
+        result = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        return (x, y) if score >= confidence else None
+
+
+def time_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found = func()
+    return (time.perf_counter() - start) / repeat, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--templates', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--confidence', type=float, default=0.9)
+    args = parser.parse_args()
+
+    screen = synthetic_screenshot(args.width, args.height)
+    rng = np.random.default_rng(1)
+    matcher = PyramidMatcher()
+
+    print(f"Screen {args.width}x{args.height}, confidence {args.confidence}")
+    total_full = total_pyramid = 0.0
+    for i in range(args.templates):
+        # Crop something that looks like a widget rather than empty background
+        needle = None
+        while needle is None or needle.std() < 20:
+            w, h = int(rng.integers(48, 160)), int(rng.integers(24, 64))
+            x, y = int(rng.integers(0, args.width - w)), int(rng.integers(0, args.height - h))
+            needle = screen[y:y + h, x:x + w].copy()
+
+        full_time, _ = time_call(
+            lambda: full_resolution_locate(screen, needle, args.confidence), args.repeat)
+        pyramid_time, box = time_call(
+            lambda: matcher.locate(screen, needle, args.confidence), args.repeat)
+        total_full += full_time
+        total_pyramid += pyramid_time
+
+        hit = box is not None and (box.left, box.top) == (x, y)
+        print(f"  template {i} {w}x{h} at ({x}, {y}): "
+              f"full {full_time * 1000:7.1f} ms, "
+              f"pyramid {pyramid_time * 1000:6.1f} ms, "
+              f"{'found' if hit else 'MISSED'}")
+
+    print(f"Average speedup: {total_full / total_pyramid:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
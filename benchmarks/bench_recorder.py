@@ -0,0 +1,81 @@
+"""Measure InputRecorder throughput and hook-callback latency.
+
+Synthetic mouse and keyboard events are fed to the recorder's callbacks
+from a producer thread while the flush thread writes to disk, the same
+arrangement as live recording.
+
+    python benchmarks/bench_recorder.py --events 500000
+"""
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_recorder import InputRecorder, load_events
+
+# Shaped like the event objects the keyboard and mouse packages deliver
+MoveEvent = collections.namedtuple('MoveEvent', 'x y time')
+ButtonEvent = collections.namedtuple('ButtonEvent', 'event_type button time')
+KeyboardEvent = collections.namedtuple('KeyboardEvent', 'event_type name time')
+
+
+def synthetic_events(count):
+    events = []
+    now = time.time()
+    for i in range(count):
+        if i % 10 == 9:
+            events.append(('key', KeyboardEvent('down' if i % 20 == 9 else 'up', 'a', now)))
+        elif i % 50 == 48:
+            events.append(('mouse', ButtonEvent('down', 'left', now)))
+        else:
+            events.append(('mouse', MoveEvent(i % 3840, i % 2160, now)))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=500000)
+    parser.add_argument('--capacity', type=int, default=1 << 16)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.events)
+    latencies = np.zeros(len(events), dtype=np.int64)
+    path = os.path.join(tempfile.mkdtemp(), 'recording.bin')
+    recorder = InputRecorder(path, capacity=args.capacity)
+    recorder.start(hooks=False)
+
+    def produce():
+        clock = time.perf_counter_ns
+        on_key, on_mouse = recorder.on_key, recorder.on_mouse
+        for i, (source, event) in enumerate(events):
+            start = clock()
+            if source == 'key':
+                on_key(event)
+            else:
+                on_mouse(event)
+            latencies[i] = clock() - start
+
+    start = time.perf_counter()
+    producer = threading.Thread(target=produce)
+    producer.start()
+    producer.join()
+    elapsed = time.perf_counter() - start
+    recorder.stop()
+
+    written = len(load_events(path))
+    print(f"{args.events} events in {elapsed:.2f}s: {args.events / elapsed:,.0f} events/s")
+    print(f"callback latency: median {np.median(latencies) / 1000:.2f} us, "
+          f"p99 {np.percentile(latencies, 99) / 1000:.2f} us, "
+          f"max {latencies.max() / 1000:.1f} us")
+    print(f"written {written}, dropped {recorder.dropped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare the memory used by StepStore against a plain list of step dicts.
+
+    python benchmarks/bench_step_store.py --steps 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from step_store import load_step_store
+
+
+def recorded_steps(count, seed=0):
+    """Steps shaped like a raw recording: mostly moves, some clicks and waits"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.8:
+            yield {"action": "Mouse Move",
+                   "params": {"x": rng.randrange(3840), "y": rng.randrange(2160)}}
+        elif roll < 0.9:
+            yield {"action": "Wait", "params": {"seconds": round(rng.random(), 3)}}
+        elif roll < 0.97:
+            yield {"action": "Click", "params": {"x": rng.randrange(3840), "y": rng.randrange(2160)}}
+        else:
+            yield {"action": "Click Reference Image",
+                   "params": {"reference": {"type": "Image", "path": "ref_images/ok.png"},
+                              "confidence": 0.9}}
+
+
+def load(path, parse):
+    with open(path, 'r') as f:
+        return parse(f)
+
+
+def measure(build):
+    """Result, retained bytes, peak bytes and load time of build().
+
+    Memory is traced in a separate run, since tracing slows the load down
+    several times over.
+    """
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = build()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, default=200000)
+    args = parser.parse_args()
+
+    # Load from a file like load_macro does, so every dict is distinct
+    path = os.path.join(tempfile.mkdtemp(), 'macro_config.json')
+    with open(path, 'w') as f:
+        json.dump(list(recorded_steps(args.steps)), f, indent=4)
+
+    dicts, dict_bytes, dict_peak, dict_time = measure(lambda: load(path, json.load))
+    store, store_bytes, store_peak, store_time = measure(lambda: load(path, load_step_store))
+    assert store.to_list() == dicts
+
+    print(f"{args.steps} steps")
+    print(f"  list of dicts: {dict_bytes / 2**20:8.1f} MB ({dict_bytes / args.steps:6.1f} B/step), "
+          f"peak {dict_peak / 2**20:6.1f} MB, load {dict_time:.2f}s")
+    print(f"  StepStore:     {store_bytes / 2**20:8.1f} MB ({store_bytes / args.steps:6.1f} B/step), "
+          f"peak {store_peak / 2**20:6.1f} MB, load {store_time:.2f}s")
+    print(f"  {dict_bytes / store_bytes:.1f}x smaller, {len(store.layouts)} shared param layouts")
+
+
+if __name__ == "__main__":
+    main()
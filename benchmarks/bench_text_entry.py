@@ -0,0 +1,54 @@
+"""Compare Type Text strategies in characters per second.
+
+Text of growing length goes through each strategy on the in-memory
+recording backend, or on a real backend with --input (use a throwaway
+display, since the text is really typed).
+
+    python benchmarks/bench_text_entry.py
+    DISPLAY=:99 python benchmarks/bench_text_entry.py --input xtest
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_backend import create_input_backend
+from text_entry import TextEntryEngine
+
+
+class MemoryClipboard:
+    """Stand-in clipboard for the recording backend"""
+
+    def __init__(self):
+        self.text = ''
+
+    def get(self):
+        return self.text
+
+    def set(self, text):
+        self.text = text
+
+    def available(self):
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', default='record')
+    parser.add_argument('--lengths', default='16,256,4096')
+    args = parser.parse_args()
+
+    backend = create_input_backend(args.input)
+    clipboard = MemoryClipboard() if args.input == 'record' else None
+    engine = TextEntryEngine(backend, clipboard=clipboard)
+    sample = "The quick brown fox jumps over the lazy dog. "
+    for length in (int(n) for n in args.lengths.split(',')):
+        text = (sample * (length // len(sample) + 1))[:length]
+        for strategy in ('keys', 'chunked', 'clipboard', 'auto'):
+            result = engine.type(text, strategy)
+            print(f"{length:>6} chars {strategy:<9} -> {result.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare per-step element waits with batched selector resolution.
+
+Clicks through a form of --fields CSS/XPath steps on the stub WebDriver,
+once the way the handlers used to (WebDriverWait for a clickable
+element, then click) and once through web_selectors.SelectorResolver,
+which resolves the whole run in one script and re-checks it per step by
+DOM epoch. --latency adds a delay to every WebDriver command; --mutating
+makes every click change the DOM so the cache is rebuilt each step.
+
+    python benchmarks/bench_web_selectors.py --fields 20 --latency 0.002
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_selectors import SelectorResolver
+from web_session import create_webdriver
+from webdriver_stub import StubWebDriver
+
+
+def per_step(driver, targets):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    by = {'css': By.CSS_SELECTOR, 'xpath': By.XPATH}
+    for kind, selector in targets:
+        WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((by[kind], selector))).click()
+
+
+def batched(driver, targets):
+    resolver = SelectorResolver(driver)
+    resolver.prefetch(targets)
+    for kind, selector in targets:
+        resolver.click(kind, selector, 5)
+    return resolver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fields', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.002)
+    parser.add_argument('--mutating', action='store_true')
+    args = parser.parse_args()
+
+    targets = []
+    page = {}
+    for i in range(args.fields):
+        kind = 'css' if i % 2 == 0 else 'xpath'
+        selector = f'#field-{i}' if kind == 'css' else f'//button[@id="submit-{i}"]'
+        targets.append((kind, selector))
+        page[selector] = {'rect': {'x': 10, 'y': 30 * i, 'width': 120, 'height': 24},
+                          'mutates': args.mutating}
+
+    stub = StubWebDriver(page=page, latency=args.latency).start()
+    driver = create_webdriver(stub.url)
+    try:
+        for name, run in (('per-step waits', per_step), ('batched resolver', batched)):
+            driver.get('https://example.test/form')
+            before = stub.requests
+            start = time.perf_counter()
+            result = run(driver, targets)
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {elapsed * 1000:.1f} ms, "
+                  f"{stub.requests - before} WebDriver commands for {args.fields} clicks")
+            if isinstance(result, SelectorResolver):
+                print(f"  {result.stats()}")
+    finally:
+        driver.quit()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare a fresh browser per macro with the pooled WebDriver sessions.
+
+Runs against the stub WebDriver endpoint in this folder, whose session
+start sleeps for --startup-delay to stand in for a browser launch, or
+against a real driver with --webdriver.
+
+    python benchmarks/bench_web_sessions.py --runs 10 --startup-delay 1.0
+    python benchmarks/bench_web_sessions.py --webdriver chrome --runs 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_session import WebSessionPool, create_webdriver
+from webdriver_stub import StubWebDriver
+
+
+def macro(driver):
+    """What a short web macro does with its browser"""
+    driver.get('about:blank')
+    driver.execute_script('return document.title')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--startup-delay', type=float, default=1.0)
+    parser.add_argument('--webdriver', default=None,
+                        help="real WebDriver to use instead of the stub")
+    args = parser.parse_args()
+
+    stub = None
+    kind = args.webdriver
+    if kind is None:
+        stub = StubWebDriver(startup_delay=args.startup_delay).start()
+        kind = stub.url
+
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        driver = create_webdriver(kind)
+        macro(driver)
+        driver.quit()
+    cold = time.perf_counter() - start
+
+    pool = WebSessionPool(lambda: create_webdriver(kind), max_sessions=1)
+    warm_start = time.perf_counter()
+    for thread in pool.prewarm():
+        thread.join()
+    warmup = time.perf_counter() - warm_start
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        with pool.session() as driver:
+            macro(driver)
+    pooled = time.perf_counter() - start
+    stats = pool.stats()
+    pool.close()
+    if stub is not None:
+        stub.stop()
+
+    print(f"fresh browser per macro: {cold / args.runs * 1000:.1f} ms per run")
+    print(f"pooled session: {pooled / args.runs * 1000:.1f} ms per run "
+          f"(+{warmup * 1000:.0f} ms one-off warm-up)")
+    print(f"pool: {stats['created']} started, {stats['reused']} reused, "
+          f"{stats['failed_checks']} failed health checks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Minimal W3C WebDriver endpoint for exercising the session pool offline.
+
+It implements just enough of the protocol for selenium's Remote driver:
+sessions, navigation, title, cookies, script execution, element lookup
+and clicks, against a fake page whose elements are given as
+{css selector or xpath: {"rect": {...}, "text": ..., "mutates": bool}}.
+Session creation sleeps for ``startup_delay`` to stand in for a browser
+launch and every command sleeps for ``latency`` to stand in for the
+driver round trip. The batched selector script from web_selectors is
+answered natively; clicking an element marked "mutates" bumps the page's
+DOM epoch.
+
+    python benchmarks/webdriver_stub.py --port 4444 --startup-delay 1.5
+    MACROFLOW_WEBDRIVER=http://127.0.0.1:4444 python macro-cli.py web_macro.json
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+
+
+class StubSession:
+    def __init__(self):
+        self.url = 'about:blank'
+        self.cookies = {}
+        self.clicks = []
+        self.elements = {}
+        self.token = uuid.uuid4().hex
+        self.epoch = 0
+
+
+class StubWebDriver:
+    """The stub server; run it in a thread with ``start()``.
+
+    ``page`` maps selectors to element dicts. ``script_handler(session,
+    script, args)`` may be set to answer execute_script calls. Otherwise
+    "return 1" returns 1, scripts given an element (selenium's is_displayed
+    atom) return true and every other script returns null.
+    """
+
+    def __init__(self, port=0, startup_delay=0.0, page=None, latency=0.0):
+        self.startup_delay = startup_delay
+        self.latency = latency
+        self.page = page or {}
+        self.script_handler = None
+        self.sessions = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._dispatch(self, 'GET')
+
+            def do_POST(self):
+                stub._dispatch(self, 'POST')
+
+            def do_DELETE(self):
+                stub._dispatch(self, 'DELETE')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def element(self, session, selector):
+        """Register an element handle for a page selector and return its id"""
+        for element_id, known in session.elements.items():
+            if known == selector:
+                return element_id
+        element_id = uuid.uuid4().hex
+        session.elements[element_id] = selector
+        return element_id
+
+    def _dispatch(self, request, method):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        length = int(request.headers.get('Content-Length') or 0)
+        body = json.loads(request.rfile.read(length) or b'{}') if length else {}
+        parts = [p for p in request.path.split('/') if p]
+        try:
+            status, value = 200, self._route(method, parts, body)
+        except KeyError as e:
+            status, value = 404, {'error': str(e.args[0]), 'message': str(e.args[0]),
+                                  'stacktrace': ''}
+        data = json.dumps({'value': value}).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json; charset=utf-8')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _route(self, method, parts, body):
+        if parts == ['status']:
+            return {'ready': True, 'message': 'stub'}
+        if parts == ['session'] and method == 'POST':
+            time.sleep(self.startup_delay)
+            session_id = uuid.uuid4().hex
+            with self._lock:
+                self.sessions[session_id] = StubSession()
+            return {'sessionId': session_id,
+                    'capabilities': {'browserName': 'stub', 'browserVersion': '1'}}
+
+        session_id, rest = parts[1], parts[2:]
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError('invalid session id')
+        if not rest and method == 'DELETE':
+            with self._lock:
+                del self.sessions[session_id]
+            return None
+        if rest == ['url']:
+            if method == 'POST':
+                session.url = body['url']
+                session.elements.clear()
+                session.token = uuid.uuid4().hex
+                session.epoch = 0
+                return None
+            return session.url
+        if rest == ['title']:
+            return 'Stub page'
+        if rest == ['goog', 'cdp', 'execute']:
+            if body['cmd'] == 'Network.clearBrowserCookies':
+                session.cookies.clear()
+            return {}
+        if rest == ['window', 'handles']:
+            return ['main']
+        if rest == ['window'] and method == 'POST':
+            return None
+        if rest and rest[0] == 'cookie':
+            if method == 'POST':
+                cookie = body['cookie']
+                session.cookies[cookie['name']] = cookie
+                return None
+            if method == 'DELETE':
+                if len(rest) > 1:
+                    session.cookies.pop(rest[1], None)
+                else:
+                    session.cookies.clear()
+                return None
+            return list(session.cookies.values())
+        if rest == ['execute', 'sync']:
+            if self.script_handler is not None:
+                return self.script_handler(session, body['script'], body.get('args', []))
+            if '__macroflowDom' in body['script']:
+                return self._resolve(session, *body['args'])
+            if body['script'].strip() == 'return 1':
+                return 1
+            args = body.get('args') or []
+            return True if any(isinstance(a, dict) and ELEMENT_KEY in a for a in args) else None
+        if rest == ['element'] and method == 'POST':
+            if body['value'] not in self.page:
+                raise KeyError('no such element')
+            return {ELEMENT_KEY: self.element(session, body['value'])}
+        if len(rest) == 3 and rest[0] == 'element':
+            selector = session.elements.get(rest[1])
+            if selector is None:
+                raise KeyError('stale element reference')
+            if rest[2] == 'click':
+                session.clicks.append(selector)
+                if self.page[selector].get('mutates'):
+                    session.epoch += 1
+                return None
+            if rest[2] == 'rect':
+                return self.page[selector].get('rect', {'x': 0, 'y': 0, 'width': 0, 'height': 0})
+            if rest[2] == 'text':
+                return self.page[selector].get('text', '')
+            if rest[2] in ('enabled', 'displayed'):
+                return True
+        if rest == ['timeouts']:
+            return None
+        raise KeyError('unknown command')
+
+    def _resolve(self, session, token, epoch, targets):
+        """Answer web_selectors' batched lookup against the fake page"""
+        if token == session.token and epoch == session.epoch:
+            return [session.token, session.epoch, None]
+        results = []
+        for _, selector in targets:
+            element = self.page.get(selector)
+            if element is None:
+                results.append([None, None, False, None])
+                continue
+            rect = element.get('rect', {'x': 0, 'y': 0, 'width': 10, 'height': 10})
+            results.append([{ELEMENT_KEY: self.element(session, selector)},
+                            [rect['x'], rect['y'], rect['width'], rect['height']],
+                            rect['width'] > 0 and rect['height'] > 0, None])
+        return [session.token, session.epoch, results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=4444)
+    parser.add_argument('--startup-delay', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubWebDriver(args.port, args.startup_delay, latency=args.latency)
+    print(f"Stub WebDriver listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+FORMATS = {
+    # extension, imencode flags for the given compression level
+    'png': ('.png', lambda level: [cv2.IMWRITE_PNG_COMPRESSION, level]),
+    'raw': ('.bmp', lambda level: []),
+}
+
+
+class CaptureWriter:
+    """Encodes and writes captured images on a worker pool.
+
+    ``submit`` only reserves a file name and queues the pixels, so the UI
+    thread that grabbed them returns immediately. Names carry a millisecond
+    timestamp and a sequence number and files are opened exclusively, so a
+    burst of captures never overwrites an earlier one. ``compression`` is
+    the PNG level (0-9); the "raw" format writes uncompressed BMP files for
+    the cheapest possible encode. ``on_submitted`` gets (path, image) on
+    the submitting thread before the write is queued. A name that is taken
+    after all gets a numbered suffix, so a saved file can end up at another
+    path than ``submit`` returned. Saved files are passed to ``on_saved`` as
+    (submitted path, written path, image). Every capture is reported on
+    ``results`` as (submitted path, written path, error); the written path
+    is None when the file could not be written, and an error with a written
+    path came from ``on_saved``.
+    """
+
+    def __init__(self, directory, workers=2, image_format='png', compression=3,
+                 prefix='capture', on_submitted=None, on_saved=None):
+        if image_format not in FORMATS:
+            raise Exception(f"Unknown capture format: {image_format}")
+        self.directory = directory
+        self.image_format = image_format
+        self.compression = compression
+        self.prefix = prefix
+        self.on_submitted = on_submitted
+        self.on_saved = on_saved
+        self.results = queue.Queue()
+        self.written = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.encode_time = 0.0
+        self._sequence = itertools.count(1)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, image, name=None):
+        """Queue an image for writing and return the path it will get"""
+        extension, _ = FORMATS[self.image_format]
+        if name is None:
+            now = time.time()
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+            name = f"{self.prefix}_{stamp}-{int(now * 1000) % 1000:03d}-{next(self._sequence):04d}"
+        path = os.path.join(self.directory, name + extension)
+        if self.on_submitted:
+            self.on_submitted(path, image)
+        with self._lock:
+            self._pending += 1
+        self._executor.submit(self._write, path, image)
+        return path
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def flush(self, timeout=None):
+        """Wait until every queued capture is on disk; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'written': self.written,
+                'failed': self.failed,
+                'pending': self._pending,
+                'bytes': self.bytes_written,
+                'encode_avg': self.encode_time / self.written if self.written else 0.0,
+            }
+
+    def _write(self, submitted, image):
+        path = error = None
+        try:
+            extension, flags = FORMATS[self.image_format]
+            start = time.perf_counter()
+            ok, encoded = cv2.imencode(extension, image, flags(self.compression))
+            if not ok:
+                raise Exception(f"Could not encode capture as {extension}")
+            elapsed = time.perf_counter() - start
+            path = self._open_exclusive(submitted, encoded.tobytes())
+            with self._lock:
+                self.written += 1
+                self.bytes_written += encoded.nbytes
+                self.encode_time += elapsed
+        except Exception as e:
+            error = e
+            with self._lock:
+                self.failed += 1
+        if error is None and self.on_saved:
+            try:
+                self.on_saved(submitted, path, image)
+            except Exception as e:
+                # The file is on disk; only the callback failed
+                error = e
+        self.results.put((submitted, path, error))
+        with self._lock:
+            self._pending -= 1
+
+    def _open_exclusive(self, path, data):
+        base, extension = os.path.splitext(path)
+        for attempt in itertools.count():
+            candidate = path if attempt == 0 else f"{base}-{attempt}{extension}"
+            try:
+                fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                             getattr(os, 'O_BINARY', 0))
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            return candidate
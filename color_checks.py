@@ -0,0 +1,111 @@
+import collections
+
+import cv2
+import numpy as np
+
+ColorMatch = collections.namedtuple('ColorMatch', 'x y pixels box')
+
+
+def parse_color(value):
+    """Turn "#RRGGBB", "r,g,b" or an [r, g, b] list into an (r, g, b) tuple"""
+    parts = value
+    try:
+        if isinstance(value, str):
+            text = value.strip()
+            if text.startswith('#') and len(text) == 7:
+                return tuple(int(text[i:i + 2], 16) for i in (1, 3, 5))
+            parts = text.split(',')
+        color = tuple(int(part) for part in parts)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid color {value!r}")
+    if len(color) != 3 or not all(0 <= c <= 255 for c in color):
+        raise ValueError(f"invalid color {value!r}")
+    return color
+
+
+class PixelChecks:
+    """A batch of (x, y, color, tolerance) assertions held as NumPy columns.
+
+    The same format the capture tool copies: ``x,y`` coordinates and an
+    ``r,g,b`` or ``#rrggbb`` color. A check passes when every channel is
+    within its tolerance of the expected value. All checks are evaluated
+    against one frame with a single fancy-indexing gather.
+    """
+
+    def __init__(self, checks, tolerance=10):
+        xs, ys, colors, tolerances = [], [], [], []
+        for i, check in enumerate(checks):
+            if not isinstance(check, dict):
+                raise ValueError(f"check {i + 1}: expected an object with x, y and color")
+            try:
+                xs.append(int(check['x']))
+                ys.append(int(check['y']))
+                colors.append(parse_color(check['color']))
+                tolerances.append(int(check.get('tolerance', tolerance)))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"check {i + 1}: {e}")
+        self.xs = np.array(xs, dtype=np.intp)
+        self.ys = np.array(ys, dtype=np.intp)
+        # Frames are BGR, so store the expected colors that way round
+        self.expected = np.array(colors, dtype=np.int16).reshape(-1, 3)[:, ::-1]
+        self.tolerances = np.array(tolerances, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def evaluate(self, frame):
+        """Return a list of (index, x, y, expected rgb, actual rgb) failures"""
+        height, width = frame.shape[:2]
+        inside = (self.xs >= 0) & (self.xs < width) & (self.ys >= 0) & (self.ys < height)
+        actual = np.zeros_like(self.expected)
+        actual[inside] = frame[self.ys[inside], self.xs[inside], :3]
+        diff = np.abs(actual - self.expected).max(axis=1)
+        failed = np.flatnonzero(~inside | (diff > self.tolerances))
+        return [(int(i), int(self.xs[i]), int(self.ys[i]),
+                 tuple(int(c) for c in self.expected[i, ::-1]),
+                 tuple(int(c) for c in actual[i, ::-1]) if inside[i] else None)
+                for i in failed]
+
+
+def find_color(frame, color, tolerance=10, region=None, min_pixels=1, cell=8):
+    """Locate the largest cluster of pixels within tolerance of an (r, g, b) color.
+
+    ``frame`` is a BGR screen grab and ``region`` an optional (left, top,
+    right, bottom) to search inside it. Matching pixels are clustered on a
+    grid of ``cell`` x ``cell`` blocks, so pixels a few apart (anti-aliased
+    text, dithered icons) count as one cluster and labelling only touches
+    the coarse grid instead of the whole frame. Returns a ColorMatch with
+    the cluster's centroid in frame coordinates, its pixel count and
+    (left, top, width, height) bounds, or None when no cluster reaches
+    ``min_pixels``.
+    """
+    left = top = 0
+    if region is not None:
+        left, top, right, bottom = region
+        left, top = max(0, left), max(0, top)
+        frame = frame[top:bottom, left:right]
+    if frame.size == 0:
+        return None
+    r, g, b = color
+    lower = np.array([max(0, b - tolerance), max(0, g - tolerance), max(0, r - tolerance)], np.uint8)
+    upper = np.array([min(255, b + tolerance), min(255, g + tolerance), min(255, r + tolerance)], np.uint8)
+    mask = cv2.inRange(frame[:, :, :3], lower, upper)
+
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return None
+    points = points.reshape(-1, 2)
+    height, width = mask.shape
+    cells_y, cells_x = points[:, 1] // cell, points[:, 0] // cell
+    grid = np.zeros((height // cell + 1, width // cell + 1), np.uint8)
+    grid[cells_y, cells_x] = 255
+    _, labels = cv2.connectedComponents(grid, connectivity=8)
+    point_labels = labels[cells_y, cells_x]
+    best = int(np.argmax(np.bincount(point_labels)))
+    cluster = points[point_labels == best]
+    if len(cluster) < min_pixels:
+        return None
+    cx, cy = cluster.mean(axis=0)
+    (x0, y0), (x1, y1) = cluster.min(axis=0), cluster.max(axis=0)
+    return ColorMatch(int(round(cx)) + left, int(round(cy)) + top, len(cluster),
+                      (int(x0) + left, int(y0) + top, int(x1 - x0) + 1, int(y1 - y0) + 1))
@@ -0,0 +1,51 @@
+import time
+
+
+class CursorProbe:
+    """Samples the cursor position and the single pixel under it.
+
+    ``tick()`` is meant to be driven by a timer such as Tk's ``after``: it
+    returns how many milliseconds to wait before the next tick. The cursor
+    position, which is cheap to query, is polled every ``active_interval``
+    ms. The pixel is read on every tick while the cursor moves; once it has
+    been still for ``idle_after`` seconds the pixel is only reread every
+    ``idle_interval`` ms. ``on_position`` and ``on_color`` are only called
+    when their value actually changes.
+    """
+
+    def __init__(self, screen, get_position, on_position=None, on_color=None,
+                 active_interval=100, idle_interval=1000, idle_after=1.0):
+        self.screen = screen
+        self.get_position = get_position
+        self.on_position = on_position
+        self.on_color = on_color
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.idle_after = idle_after
+        self.position = None
+        self.color = None
+        self.last_moved = 0.0
+        self.last_sampled = 0.0
+        self.samples = 0
+
+    def tick(self):
+        now = time.monotonic()
+        x, y = self.get_position()
+        if (x, y) != self.position:
+            self.position = (x, y)
+            self.last_moved = now
+            if self.on_position:
+                self.on_position(x, y)
+
+        idle = now - self.last_moved >= self.idle_after
+        if idle and now - self.last_sampled < self.idle_interval / 1000.0:
+            return self.active_interval
+
+        color = self.screen.pixel(x, y)
+        self.last_sampled = now
+        self.samples += 1
+        if color != self.color:
+            self.color = color
+            if self.on_color:
+                self.on_color(color)
+        return self.active_interval
@@ -0,0 +1,311 @@
+import os
+import sys
+import time
+
+# Actions that only send input; steps that read the screen flush pending input first
+INPUT_ACTIONS = ("Mouse Move", "Click", "Right Click", "Double Click", "Press Key", "Type Text")
+
+
+class InputBackend:
+    """Base class for everything that sends mouse and keyboard input.
+
+    ``pace`` is the pause in seconds after every call, the explicit
+    replacement for pyautogui's global PAUSE; the default of 0 sends input
+    as fast as the backend accepts it; ``default_pace`` keeps the value the
+    backend was created with. Backends that can queue events hold
+    them until ``flush()`` or the next pace pause, so a burst of clicks and
+    keys costs one round trip. Subclasses implement ``_move``, ``_button``,
+    ``_key``, ``position`` and, if they queue, ``flush``.
+    """
+
+    BUTTONS = ('left', 'middle', 'right')
+
+    def __init__(self, pace=0.0):
+        self.pace = self.default_pace = pace
+        self.calls = 0
+        self.events = 0
+
+    def move(self, x, y, duration=0.0):
+        """Move the pointer, in ~60 Hz steps when a duration is given"""
+        if duration > 0:
+            start_x, start_y = self.position()
+            steps = max(1, int(duration * 60))
+            for i in range(1, steps):
+                self._move(int(start_x + (x - start_x) * i / steps),
+                           int(start_y + (y - start_y) * i / steps))
+                self.flush()
+                time.sleep(duration / steps)
+        self._move(int(x), int(y))
+        self._paced()
+
+    def click(self, x=None, y=None, button='left', clicks=1, hold=0.0):
+        """Click, keeping the button down for ``hold`` seconds each time"""
+        if button not in self.BUTTONS:
+            raise Exception(f"Unknown mouse button: {button}")
+        if x is not None and y is not None:
+            self._move(int(x), int(y))
+        for _ in range(clicks):
+            self._button(button, True)
+            self._hold(hold)
+            self._button(button, False)
+        self._paced()
+
+    def press(self, key, presses=1, hold=0.0):
+        """Press a key, keeping it down for ``hold`` seconds each time"""
+        for _ in range(presses):
+            self._key(key, True)
+            self._hold(hold)
+            self._key(key, False)
+        self._paced()
+
+    def hotkey(self, *keys):
+        """Hold keys down in order and release them in reverse"""
+        for key in keys:
+            self._key(key, True)
+        for key in reversed(keys):
+            self._key(key, False)
+        self._paced()
+
+    def write(self, text):
+        """Type text; each character is one key press"""
+        for char in text:
+            self._key(char, True)
+            self._key(char, False)
+        self._paced()
+
+    def position(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Deliver any queued events"""
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        return {'calls': self.calls, 'events': self.events, 'pace': self.pace}
+
+    def _paced(self):
+        self.calls += 1
+        if self.pace > 0:
+            self.flush()
+            time.sleep(self.pace)
+
+    def _hold(self, seconds):
+        if seconds > 0:
+            self.flush()
+            time.sleep(seconds)
+
+    def _move(self, x, y):
+        raise NotImplementedError
+
+    def _button(self, button, down):
+        raise NotImplementedError
+
+    def _key(self, key, down):
+        raise NotImplementedError
+
+
+class PyAutoGUIBackend(InputBackend):
+    """Sends input through pyautogui with its built-in PAUSE switched off.
+
+    Whole calls are passed through (pyautogui.write for text and so on) so
+    pyautogui's own key mapping and platform handling still apply.
+    """
+
+    def __init__(self, pace=0.0):
+        super().__init__(pace)
+        import pyautogui
+        self.pyautogui = pyautogui
+        pyautogui.PAUSE = 0
+
+    def move(self, x, y, duration=0.0):
+        self.pyautogui.moveTo(x, y, duration=duration)
+        self.events += 1
+        self._paced()
+
+    def click(self, x=None, y=None, button='left', clicks=1, hold=0.0):
+        if hold > 0:
+            if x is not None and y is not None:
+                self.pyautogui.moveTo(x, y)
+            for _ in range(clicks):
+                self.pyautogui.mouseDown(button=button)
+                time.sleep(hold)
+                self.pyautogui.mouseUp(button=button)
+        else:
+            self.pyautogui.click(x, y, clicks=clicks, button=button)
+        self.events += 2 * clicks
+        self._paced()
+
+    def press(self, key, presses=1, hold=0.0):
+        if hold > 0:
+            for _ in range(presses):
+                self.pyautogui.keyDown(key)
+                time.sleep(hold)
+                self.pyautogui.keyUp(key)
+        else:
+            self.pyautogui.press(key, presses=presses)
+        self.events += 2 * presses
+        self._paced()
+
+    def hotkey(self, *keys):
+        self.pyautogui.hotkey(*keys)
+        self.events += 2 * len(keys)
+        self._paced()
+
+    def write(self, text):
+        self.pyautogui.write(text)
+        self.events += 2 * len(text)
+        self._paced()
+
+    def position(self):
+        x, y = self.pyautogui.position()
+        return x, y
+
+
+# pyautogui key names that differ from X keysym names
+_X11_KEYS = {
+    'enter': 'Return', 'return': 'Return', '\n': 'Return', 'esc': 'Escape',
+    'escape': 'Escape', 'tab': 'Tab', '\t': 'Tab', 'backspace': 'BackSpace',
+    'delete': 'Delete', 'del': 'Delete', 'space': 'space', 'up': 'Up',
+    'down': 'Down', 'left': 'Left', 'right': 'Right', 'home': 'Home',
+    'end': 'End', 'pageup': 'Prior', 'pgup': 'Prior', 'pagedown': 'Next',
+    'pgdn': 'Next', 'insert': 'Insert', 'ctrl': 'Control_L', 'ctrlleft': 'Control_L',
+    'ctrlright': 'Control_R', 'shift': 'Shift_L', 'shiftleft': 'Shift_L',
+    'shiftright': 'Shift_R', 'alt': 'Alt_L', 'altleft': 'Alt_L', 'altright': 'Alt_R',
+    'win': 'Super_L', 'winleft': 'Super_L', 'winright': 'Super_R',
+    'capslock': 'Caps_Lock', 'printscreen': 'Print',
+}
+_X11_KEYS.update({f'f{number}': f'F{number}' for number in range(1, 25)})
+
+
+class XTestBackend(InputBackend):
+    """Injects input straight into an X server with the XTEST extension.
+
+    Events go into Xlib's output buffer and reach the server on ``flush``,
+    so a whole batch costs a single round trip. Needs python-xlib, which
+    pyautogui already depends on under Linux.
+    """
+
+    BUTTON_NUMBERS = {'left': 1, 'middle': 2, 'right': 3}
+
+    def __init__(self, display=None, pace=0.0):
+        super().__init__(pace)
+        from Xlib import X, XK, display as xdisplay
+        from Xlib.ext import xtest
+        self.X, self.XK, self.xtest = X, XK, xtest
+        self.display = xdisplay.Display(display or os.environ.get('DISPLAY'))
+        if not self.display.has_extension('XTEST'):
+            raise Exception("X server does not support the XTEST extension")
+        self._keycodes = {}
+        self._pending = False
+
+    def position(self):
+        self.flush()
+        pointer = self.display.screen().root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def flush(self):
+        if self._pending:
+            self.display.sync()
+            self._pending = False
+
+    def close(self):
+        self.flush()
+        self.display.close()
+
+    def _fake(self, event_type, detail=0, x=0, y=0):
+        self.xtest.fake_input(self.display, event_type, detail, x=x, y=y)
+        self.events += 1
+        self._pending = True
+
+    def _move(self, x, y):
+        self._fake(self.X.MotionNotify, x=x, y=y)
+
+    def _button(self, button, down):
+        self._fake(self.X.ButtonPress if down else self.X.ButtonRelease,
+                   self.BUTTON_NUMBERS[button])
+
+    def _key(self, key, down):
+        keycode, shifted = self._keycode(key)
+        shift = self._keycode('shift')[0] if shifted else None
+        if down:
+            if shift:
+                self._fake(self.X.KeyPress, shift)
+            self._fake(self.X.KeyPress, keycode)
+        else:
+            self._fake(self.X.KeyRelease, keycode)
+            if shift:
+                self._fake(self.X.KeyRelease, shift)
+
+    def _keycode(self, key):
+        """(keycode, needs shift) for a pyautogui key name or a character"""
+        cached = self._keycodes.get(key)
+        if cached is not None:
+            return cached
+        name = _X11_KEYS.get(key.lower() if len(key) > 1 else key)
+        if name is not None:
+            keysym = self.XK.string_to_keysym(name)
+        elif len(key) == 1:
+            # Latin-1 keysyms are the code point, the rest live at 0x1000000 + code point
+            code = ord(key)
+            keysym = code if code < 0x100 else 0x1000000 | code
+        else:
+            keysym = self.XK.string_to_keysym(key)
+        codes = list(self.display.keysym_to_keycodes(keysym)) if keysym else []
+        if not codes:
+            raise Exception(f"No key on this keyboard types {key!r}")
+        keycode, index = min(codes, key=lambda code: code[1])
+        self._keycodes[key] = (keycode, index % 2 == 1)
+        return self._keycodes[key]
+
+
+class RecordingBackend(InputBackend):
+    """Keeps input in memory instead of sending it, for tests and dry runs.
+
+    ``log`` holds (time, kind, detail) tuples where kind is "move",
+    "button" or "key" and detail is (x, y), (button, down) or (key, down).
+    """
+
+    def __init__(self, pace=0.0, start=(0, 0)):
+        super().__init__(pace)
+        self.log = []
+        self.cursor = start
+
+    def position(self):
+        return self.cursor
+
+    def clear(self):
+        self.log = []
+
+    def _move(self, x, y):
+        self.cursor = (x, y)
+        self.log.append((time.monotonic(), 'move', (x, y)))
+        self.events += 1
+
+    def _button(self, button, down):
+        self.log.append((time.monotonic(), 'button', (button, down)))
+        self.events += 1
+
+    def _key(self, key, down):
+        self.log.append((time.monotonic(), 'key', (key, down)))
+        self.events += 1
+
+
+def create_input_backend(kind=None, pace=0.0):
+    """Build an input backend from a name or the MACROFLOW_INPUT variable.
+
+    Accepted values are "pyautogui" (the default), "xtest",
+    "xtest:<display>" and "record".
+    """
+    kind = kind or os.environ.get('MACROFLOW_INPUT', '')
+    name, _, argument = kind.partition(':')
+    if name == 'xtest':
+        if not sys.platform.startswith('linux'):
+            raise Exception("The xtest input backend needs an X11 session")
+        return XTestBackend(':' + argument if argument else None, pace=pace)
+    if name == 'record':
+        return RecordingBackend(pace=pace)
+    if name in ('', 'pyautogui'):
+        return PyAutoGUIBackend(pace=pace)
+    raise Exception(f"Unknown input backend: {kind}")
@@ -0,0 +1,263 @@
+"""Low-overhead recording of live mouse and keyboard input.
+
+Hook callbacks write fixed-width records (time, kind, x, y, code) straight
+into preallocated NumPy columns, one ring buffer per hook thread; a
+background thread drains the rings to a raw binary file, which is
+converted into macro steps once recording stops.
+"""
+import json
+import threading
+
+import numpy as np
+
+# Record kinds
+MOVE = 1
+BUTTON_DOWN = 2
+BUTTON_UP = 3
+KEY_DOWN = 4
+KEY_UP = 5
+WHEEL = 6
+BUTTON_DOUBLE = 7
+
+EVENT_DTYPE = np.dtype([('time', '<f8'), ('kind', 'u1'), ('x', '<i4'), ('y', '<i4'), ('code', '<i4')])
+
+# Button codes stored in the code column, in the mouse package's names
+BUTTONS = ('left', 'right', 'middle', 'x', 'x2')
+
+# Button code -> (action, extra params); x/x2 have no playback equivalent
+BUTTON_ACTIONS = {
+    0: ("Click", {}),
+    1: ("Right Click", {}),
+    2: ("Click", {"button": "middle"}),
+}
+
+
+class EventRing:
+    """Single-producer, single-consumer ring buffer of event records.
+
+    The producer only assigns into preallocated column arrays and bumps an
+    integer, so pushing an event allocates nothing. Once the buffer is half
+    full ``wakeup`` is set so the consumer drains early. When the consumer
+    falls a full buffer behind, new events are counted in ``dropped``.
+    Each hook thread needs its own ring; rings can share one ``wakeup``.
+    """
+
+    def __init__(self, capacity=1 << 16, wakeup=None):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, '<f8')
+        self.kinds = np.zeros(capacity, 'u1')
+        self.xs = np.zeros(capacity, '<i4')
+        self.ys = np.zeros(capacity, '<i4')
+        self.codes = np.zeros(capacity, '<i4')
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self.wakeup = wakeup or threading.Event()
+
+    def push(self, timestamp, kind, x, y, code):
+        head = self.head
+        pending = head - self.tail
+        if pending >= self.capacity:
+            self.dropped += 1
+            return
+        if pending == self.capacity >> 1:
+            self.wakeup.set()
+        i = head % self.capacity
+        self.times[i] = timestamp
+        self.kinds[i] = kind
+        self.xs[i] = x
+        self.ys[i] = y
+        self.codes[i] = code
+        self.head = head + 1
+
+    def drain(self):
+        """Copy out everything pushed since the last drain as one record array"""
+        head, tail = self.head, self.tail
+        count = head - tail
+        records = np.empty(count, EVENT_DTYPE)
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        for field, column in (('time', self.times), ('kind', self.kinds), ('x', self.xs),
+                              ('y', self.ys), ('code', self.codes)):
+            records[field][:first] = column[start:start + first]
+            records[field][first:] = column[:count - first]
+        self.tail = head
+        return records
+
+
+class InputRecorder:
+    """Hooks keyboard and mouse, buffers events and flushes them to disk.
+
+    Keyboard hooks use the ``keyboard`` package already required by the
+    tools; mouse hooks use its companion ``mouse`` package when installed.
+    Key names are interned to integer codes; the table is saved next to
+    the recording as ``<path>.keys.json``. The two packages call back on
+    separate listener threads, so each source writes to its own ring and
+    the flusher merges them by timestamp.
+    """
+
+    def __init__(self, path, capacity=1 << 16, flush_interval=0.25):
+        self.path = path
+        self.capacity = capacity
+        self.wakeup = threading.Event()
+        self.key_ring = EventRing(capacity, self.wakeup)
+        self.mouse_ring = EventRing(capacity, self.wakeup)
+        self.flush_interval = flush_interval
+        self.key_codes = {}
+        self.key_names = []
+        self.x = 0
+        self.y = 0
+        self.recording = False
+        self.mouse_hooked = False
+        self._hooks = []
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def start(self, hooks=True):
+        """Start flushing; with hooks=False events are only fed by hand"""
+        open(self.path, 'wb').close()
+        self.key_ring = EventRing(self.capacity, self.wakeup)
+        self.mouse_ring = EventRing(self.capacity, self.wakeup)
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        self.recording = True
+        if not hooks:
+            return
+
+        import keyboard
+        self._hooks.append(('keyboard', keyboard.hook(self.on_key)))
+        try:
+            import mouse
+            self._hooks.append(('mouse', mouse.hook(self.on_mouse)))
+            self.mouse_hooked = True
+        except ImportError:
+            self.mouse_hooked = False
+
+    def stop(self):
+        for kind, hook in self._hooks:
+            if kind == 'keyboard':
+                import keyboard
+                keyboard.unhook(hook)
+            else:
+                import mouse
+                mouse.unhook(hook)
+        self._hooks = []
+        self.recording = False
+        self._stop.set()
+        self.wakeup.set()
+        self._flusher.join()
+        with open(self.path + '.keys.json', 'w') as f:
+            json.dump(self.key_names, f)
+
+    @property
+    def dropped(self):
+        return self.key_ring.dropped + self.mouse_ring.dropped
+
+    # Hook callbacks run on the hook threads and must stay cheap
+
+    def on_key(self, event):
+        code = self.key_codes.get(event.name)
+        if code is None:
+            code = self.key_codes[event.name] = len(self.key_names)
+            self.key_names.append(event.name)
+        kind = KEY_DOWN if event.event_type == 'down' else KEY_UP
+        self.key_ring.push(event.time, kind, self.x, self.y, code)
+
+    def on_mouse(self, event):
+        event_type = type(event).__name__
+        if event_type == 'MoveEvent':
+            self.x = event.x
+            self.y = event.y
+            self.mouse_ring.push(event.time, MOVE, event.x, event.y, 0)
+        elif event_type == 'ButtonEvent':
+            if event.event_type == 'up':
+                kind = BUTTON_UP
+            elif event.event_type == 'double':
+                kind = BUTTON_DOUBLE
+            else:
+                kind = BUTTON_DOWN
+            code = BUTTONS.index(event.button) if event.button in BUTTONS else len(BUTTONS)
+            self.mouse_ring.push(event.time, kind, self.x, self.y, code)
+        elif event_type == 'WheelEvent':
+            self.mouse_ring.push(event.time, WHEEL, self.x, self.y, int(event.delta))
+
+    def drain(self):
+        """Both rings' new records, merged into timestamp order"""
+        records = np.concatenate((self.key_ring.drain(), self.mouse_ring.drain()))
+        return records[np.argsort(records['time'], kind='stable')]
+
+    def _flush_loop(self):
+        with open(self.path, 'ab') as f:
+            while not self._stop.is_set():
+                self.wakeup.wait(self.flush_interval)
+                self.wakeup.clear()
+                self.drain().tofile(f)
+                f.flush()
+            self.drain().tofile(f)
+
+
+def load_events(path):
+    """Read a recording written by InputRecorder, in timestamp order"""
+    events = np.fromfile(path, dtype=EVENT_DTYPE)
+    # Each flush is sorted, but a late event from one hook thread can land
+    # in the flush after a newer one from the other
+    return events[np.argsort(events['time'], kind='stable')]
+
+
+def events_to_steps(events, key_names, min_wait=0.05):
+    """Turn recorded events into macro steps.
+
+    Pauses longer than ``min_wait`` become Wait steps, button down/up pairs
+    become clicks at the pointer position and key presses become Press Key
+    steps. A release closes its press; when the key or button was held for
+    longer than ``min_wait`` the press gets a ``hold`` parameter. Double
+    click events turn the click before them into a Double Click. Extra
+    mouse buttons (x, x2) cannot be played back and are left out.
+    """
+    steps = []
+    pressed = {}
+    last_time = events['time'][0] if len(events) else 0.0
+    for timestamp, kind, x, y, code in events.tolist():
+        if kind in (BUTTON_DOWN, BUTTON_DOUBLE, BUTTON_UP) and code not in BUTTON_ACTIONS:
+            continue
+        if kind == KEY_DOWN and (KEY_UP, code) in pressed:
+            # Auto-repeat while the key is held; the release ends the hold
+            continue
+        gap = timestamp - last_time
+        last_time = timestamp
+        if kind in (BUTTON_UP, KEY_UP):
+            down = pressed.pop((kind, code), None)
+            if down is not None and timestamp - down[0] > min_wait:
+                down[1]["params"]["hold"] = round(timestamp - down[0], 3)
+            continue
+        if kind == BUTTON_DOUBLE and code == 0:
+            # The pause inside a double click belongs to the double click
+            i = len(steps) - 1
+            if i >= 0 and steps[i]["action"] == "Wait":
+                i -= 1
+            if (i >= 0 and steps[i]["action"] == "Click" and "button" not in steps[i]["params"] and
+                    (steps[i]["params"]["x"], steps[i]["params"]["y"]) == (x, y)):
+                del steps[i + 1:]
+                # Double Click has no hold, so its release is not tracked
+                steps[i] = {"action": "Double Click", "params": {"x": x, "y": y}}
+                continue
+        if gap > min_wait:
+            steps.append({"action": "Wait", "params": {"seconds": round(gap, 3)}})
+        if kind == MOVE:
+            steps.append({"action": "Mouse Move", "params": {"x": x, "y": y}})
+        elif kind in (BUTTON_DOWN, BUTTON_DOUBLE):
+            action, extra = BUTTON_ACTIONS[code]
+            steps.append({"action": action, "params": dict(extra, x=x, y=y)})
+            pressed[(BUTTON_UP, code)] = (timestamp, steps[-1])
+        elif kind == KEY_DOWN:
+            steps.append({"action": "Press Key", "params": {"key": key_names[code]}})
+            pressed[(KEY_UP, code)] = (timestamp, steps[-1])
+    return steps
+
+
+def load_steps(path, min_wait=0.05):
+    """Convert a finished recording file into macro steps"""
+    with open(path + '.keys.json', 'r') as f:
+        key_names = json.load(f)
+    return events_to_steps(load_events(path), key_names, min_wait)
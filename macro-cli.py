@@ -0,0 +1,92 @@
+import argparse
+import json
+import sys
+
+from macro_plan import load_plan, run_plan, ExecutionContext, MacroValidationError
+from input_backend import create_input_backend
+from screen_source import create_screen_source
+
+# Exit codes
+EXIT_PASSED = 0
+EXIT_FAILED = 1
+EXIT_UNREADABLE = 2
+EXIT_INVALID = 3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a MacroFlow macro without the GUI")
+    parser.add_argument('macro', nargs='?', default='macro_config.json',
+                        help="macro file to run (default: macro_config.json)")
+    parser.add_argument('--screen', default=None,
+                        help="screen source: desktop, x11[:display] or replay:<dir>")
+    parser.add_argument('--input', default=None,
+                        help="input backend: pyautogui, xtest[:display] or record")
+    parser.add_argument('--pace', type=float, default=0.0,
+                        help="seconds to pause after every input call (default: 0)")
+    parser.add_argument('--summary', default=None,
+                        help="also write the JSON result summary to this file")
+    parser.add_argument('--check', action='store_true',
+                        help="only validate the macro, don't run it")
+    parser.add_argument('--verbose', action='store_true',
+                        help="print progress to stderr")
+    args = parser.parse_args(argv)
+
+    summary = {"macro": args.macro}
+    try:
+        screen = create_screen_source(args.screen)
+    except Exception as e:
+        summary.update(status="failed", error=f"screen source: {e}")
+        return finish(summary, args.summary, EXIT_FAILED)
+    context = ExecutionContext(screen=screen)
+    if args.verbose:
+        context.report = lambda message: print(message, file=sys.stderr)
+
+    try:
+        plan = load_plan(args.macro, context.references)
+    except MacroValidationError as e:
+        summary.update(status="invalid", errors=e.errors)
+        return finish(summary, args.summary, EXIT_INVALID)
+    except Exception as e:
+        # Missing files, bad JSON and stale stream indexes alike
+        summary.update(status="unreadable", error=str(e))
+        return finish(summary, args.summary, EXIT_UNREADABLE)
+
+    try:
+        return run(plan, context, args, summary)
+    finally:
+        plan.close()
+        context.close()
+
+
+def run(plan, context, args, summary):
+    if args.check:
+        summary.update(status="valid", steps_total=len(plan))
+        return finish(summary, args.summary, EXIT_PASSED)
+
+    try:
+        context.input = create_input_backend(args.input, args.pace)
+    except Exception as e:
+        summary.update(status="failed", error=f"input backend: {e}")
+        return finish(summary, args.summary, EXIT_FAILED)
+
+    def progress(step):
+        if args.verbose:
+            print(f"{step.index + 1}/{len(plan)} {step.action}", file=sys.stderr)
+
+    summary.update(run_plan(plan, context, on_step=progress))
+    code = EXIT_PASSED if summary["status"] == "passed" else EXIT_FAILED
+    return finish(summary, args.summary, code)
+
+
+def finish(summary, summary_path, code):
+    """Print the summary as JSON (and save it if asked) and return the exit code"""
+    text = json.dumps(summary, indent=4)
+    print(text)
+    if summary_path:
+        with open(summary_path, 'w') as f:
+            f.write(text)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
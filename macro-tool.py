@@ -2,7 +2,8 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
 import os
-import pyautogui
+import queue
+import threading
 import time
 import keyboard
 import win32gui
@@ -12,6 +13,15 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from PIL import Image, ImageTk
+from reference_store import ReferenceStore
+from screen_source import create_screen_source
+from step_view import StepListView
+from step_store import StepStore, load_step_store
+from input_recorder import InputRecorder, load_steps
+from macro_compress import compress_steps
+from macro_plan import compile_macro, run_plan, ExecutionContext, MacroValidationError
+from web_session import WebSessionPool
+from web_selectors import WEB_ACTIONS
 
 class MacroRecorder:
     def __init__(self):
@@ -29,10 +39,32 @@ class MacroRecorder:
         self.root.configure(bg=self.colors['bg'])
         self.root.geometry("800x600")
         
-        # Initialize macro steps
-        self.macro_steps = []
+        # Initialize macro steps (compact columnar store, reads back as dicts)
+        self.macro_steps = StepStore()
         self.current_step = 0
         
+        # Decoded reference images shared across steps and runs
+        self.reference_store = ReferenceStore()
+        
+        # Shared screen grabber (desktop, X11 or PNG replay)
+        self.screen = create_screen_source()
+        
+        # Progress from the playback thread is handed to Tk through a queue
+        self.run_queue = queue.Queue()
+        self.run_thread = None
+        
+        # Live input recorder, created when recording starts
+        self.recorder = None
+        
+        # Matcher, locator, browser pool and reporting shared by the action handlers
+        self.web_pool = WebSessionPool(max_sessions=1)
+        self.context = ExecutionContext(
+            screen=self.screen,
+            references=self.reference_store,
+            report=lambda message: self.run_queue.put(("status", message)),
+            web_pool=self.web_pool
+        )
+        
         # Get script directory for relative paths
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
         
@@ -61,11 +93,10 @@ class MacroRecorder:
         left_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         # Step list with scrollbar
-        self.step_list = tk.Listbox(left_panel, bg=self.colors['frame'], fg=self.colors['fg'])
-        scrollbar = ttk.Scrollbar(left_panel, orient=tk.VERTICAL, command=self.step_list.yview)
-        self.step_list.configure(yscrollcommand=scrollbar.set)
-        self.step_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # Only the visible rows are rendered, so huge macros stay responsive
+        self.step_list = StepListView(left_panel, self.macro_steps,
+                                      bg=self.colors['frame'], fg=self.colors['fg'])
+        self.step_list.pack()
         
         # Right panel - Step configuration
         right_panel = ttk.Frame(main_frame)
@@ -82,6 +113,7 @@ class MacroRecorder:
             "Type Text",
             "Press Key",
             "Wait",
+            "Set Input Pace",
             "Mouse Move",
             "Click",
             "Right Click",
@@ -89,10 +121,12 @@ class MacroRecorder:
             "Copy Text",
             "Paste Text",
             "Wait for Image",
+            "Wait for Video",
+            "Assert Pixels",
+            "Find Color",
             "Custom JavaScript",
             "CSS Selector Click",
-            "XPath Click",
-            "Load Reference Point"
+            "XPath Click"
         ]
         
         self.action_combo = ttk.Combobox(action_frame, textvariable=self.action_var, values=actions)
@@ -119,6 +153,8 @@ class MacroRecorder:
         ttk.Button(control_frame, text="Save Macro", command=self.save_macro).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Load Macro", command=self.load_macro).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Run Macro", command=self.run_macro).pack(side=tk.LEFT, padx=5)
+        self.record_button = ttk.Button(control_frame, text="Record", command=self.toggle_recording)
+        self.record_button.pack(side=tk.LEFT, padx=5)
         
         # Status bar
         self.status_var = tk.StringVar()
@@ -167,6 +203,21 @@ class MacroRecorder:
             self.url_entry = ttk.Entry(param_frame)
             self.url_entry.pack(fill=tk.X)
             
+        elif action in ("CSS Selector Click", "XPath Click"):
+            label = "CSS Selector:" if action == "CSS Selector Click" else "XPath:"
+            ttk.Label(param_frame, text=label + " (or a CSS/HTML reference)").pack()
+            self.selector_entry = ttk.Entry(param_frame)
+            self.selector_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Timeout (seconds):").pack()
+            self.timeout_entry = ttk.Entry(param_frame)
+            self.timeout_entry.insert(0, "10")
+            self.timeout_entry.pack(fill=tk.X)
+            
+        elif action == "Custom JavaScript":
+            ttk.Label(param_frame, text="Script (or a CSS/HTML reference):").pack()
+            self.script_text = tk.Text(param_frame, height=6, width=30)
+            self.script_text.pack(fill=tk.X)
+            
         elif action == "Click Reference Image":
             ttk.Label(param_frame, text="Confidence (0-1):").pack()
             self.confidence_entry = ttk.Entry(param_frame)
@@ -177,6 +228,13 @@ class MacroRecorder:
             ttk.Label(param_frame, text="Text to Type:").pack()
             self.text_entry = ttk.Entry(param_frame)
             self.text_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Method:").pack()
+            self.type_method_var = tk.StringVar(value="auto")
+            ttk.Combobox(param_frame, textvariable=self.type_method_var, state="readonly",
+                         values=["auto", "keys", "chunked", "clipboard"]).pack(fill=tk.X)
+            self.verify_text_var = tk.BooleanVar(value=False)
+            ttk.Checkbutton(param_frame, text="Verify field contents (selects all and copies)",
+                            variable=self.verify_text_var).pack()
             
         elif action == "Wait":
             ttk.Label(param_frame, text="Seconds:").pack()
@@ -184,6 +242,78 @@ class MacroRecorder:
             self.wait_entry.insert(0, "1")
             self.wait_entry.pack(fill=tk.X)
         
+        elif action == "Set Input Pace":
+            ttk.Label(param_frame, text="Seconds after each input:").pack()
+            self.pace_entry = ttk.Entry(param_frame)
+            self.pace_entry.insert(0, "0")
+            self.pace_entry.pack(fill=tk.X)
+        
+        elif action == "Paste Text":
+            ttk.Label(param_frame, text="Text (empty pastes the clipboard as is):").pack()
+            self.text_entry = ttk.Entry(param_frame)
+            self.text_entry.pack(fill=tk.X)
+        
+        elif action == "Press Key":
+            ttk.Label(param_frame, text="Key:").pack()
+            self.key_entry = ttk.Entry(param_frame)
+            self.key_entry.pack(fill=tk.X)
+        
+        elif action == "Mouse Move":
+            ttk.Label(param_frame, text="X:").pack()
+            self.x_entry = ttk.Entry(param_frame)
+            self.x_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Y:").pack()
+            self.y_entry = ttk.Entry(param_frame)
+            self.y_entry.pack(fill=tk.X)
+        
+        elif action == "Wait for Image":
+            ttk.Label(param_frame, text="Confidence (0-1):").pack()
+            self.confidence_entry = ttk.Entry(param_frame)
+            self.confidence_entry.insert(0, "0.9")
+            self.confidence_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Timeout (seconds):").pack()
+            self.timeout_entry = ttk.Entry(param_frame)
+            self.timeout_entry.insert(0, "10")
+            self.timeout_entry.pack(fill=tk.X)
+        
+        elif action == "Wait for Video":
+            ttk.Label(param_frame, text="Confidence (0-1):").pack()
+            self.confidence_entry = ttk.Entry(param_frame)
+            self.confidence_entry.insert(0, "0.9")
+            self.confidence_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Timeout (seconds):").pack()
+            self.timeout_entry = ttk.Entry(param_frame)
+            self.timeout_entry.insert(0, "10")
+            self.timeout_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Keyframes to see in order (empty: 3; 1: final frame only):").pack()
+            self.min_keyframes_entry = ttk.Entry(param_frame)
+            self.min_keyframes_entry.pack(fill=tk.X)
+        
+        elif action == "Assert Pixels":
+            # One check per line, as copied from the capture tool: "x,y r,g,b [tolerance]"
+            ttk.Label(param_frame, text="Checks (x,y color [tolerance] per line):").pack()
+            self.checks_text = tk.Text(param_frame, height=6, width=30)
+            self.checks_text.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Default tolerance:").pack()
+            self.tolerance_entry = ttk.Entry(param_frame)
+            self.tolerance_entry.insert(0, "10")
+            self.tolerance_entry.pack(fill=tk.X)
+        
+        elif action == "Find Color":
+            ttk.Label(param_frame, text="Color (r,g,b or #hex):").pack()
+            self.color_entry = ttk.Entry(param_frame)
+            self.color_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Tolerance:").pack()
+            self.tolerance_entry = ttk.Entry(param_frame)
+            self.tolerance_entry.insert(0, "10")
+            self.tolerance_entry.pack(fill=tk.X)
+            ttk.Label(param_frame, text="Region (left,top,right,bottom, optional):").pack()
+            self.region_entry = ttk.Entry(param_frame)
+            self.region_entry.pack(fill=tk.X)
+            self.click_color_var = tk.BooleanVar(value=False)
+            ttk.Checkbutton(param_frame, text="Click the found color",
+                            variable=self.click_color_var).pack()
+        
         # ... other action types ...
 
     def add_step(self):
@@ -196,8 +326,10 @@ class MacroRecorder:
         }
         
         self.macro_steps.append(step)
-        self.update_step_list()
+        self.step_list.inserted(len(self.macro_steps) - 1)
         self.status_var.set(f"Added step: {action}")
+        if action in WEB_ACTIONS:
+            self.web_pool.prewarm()
 
     def get_current_parameters(self):
         action = self.action_var.get()
@@ -211,24 +343,72 @@ class MacroRecorder:
             }
         
         # Get action-specific parameters
-        if action == "Click Reference Image":
+        if action == "Open Website":
+            params["url"] = self.url_entry.get()
+        elif action in ("CSS Selector Click", "XPath Click"):
+            name = "selector" if action == "CSS Selector Click" else "xpath"
+            if self.selector_entry.get().strip():
+                params[name] = self.selector_entry.get().strip()
+            params["timeout"] = float(self.timeout_entry.get())
+        elif action == "Custom JavaScript":
+            script = self.script_text.get("1.0", tk.END).strip()
+            if script:
+                params["script"] = script
+        elif action == "Click Reference Image":
             params["confidence"] = float(self.confidence_entry.get())
         elif action == "Type Text":
             params["text"] = self.text_entry.get()
+            params["method"] = self.type_method_var.get()
+            params["verify"] = self.verify_text_var.get()
+        elif action == "Paste Text":
+            if self.text_entry.get():
+                params["text"] = self.text_entry.get()
         elif action == "Wait":
             params["seconds"] = float(self.wait_entry.get())
+        elif action == "Set Input Pace":
+            params["seconds"] = float(self.pace_entry.get())
+        elif action == "Press Key":
+            params["key"] = self.key_entry.get()
+        elif action == "Mouse Move":
+            params["x"] = int(self.x_entry.get())
+            params["y"] = int(self.y_entry.get())
+        elif action == "Wait for Image":
+            params["confidence"] = float(self.confidence_entry.get())
+            params["timeout"] = float(self.timeout_entry.get())
+        elif action == "Wait for Video":
+            params["confidence"] = float(self.confidence_entry.get())
+            params["timeout"] = float(self.timeout_entry.get())
+            if self.min_keyframes_entry.get().strip():
+                params["min_keyframes"] = int(self.min_keyframes_entry.get())
+        elif action == "Assert Pixels":
+            checks = []
+            for line in self.checks_text.get("1.0", tk.END).splitlines():
+                parts = line.split()
+                if not parts:
+                    continue
+                x, y = parts[0].split(",")
+                check = {"x": int(x), "y": int(y), "color": parts[1]}
+                if len(parts) > 2:
+                    check["tolerance"] = int(parts[2])
+                checks.append(check)
+            params["checks"] = checks
+            params["tolerance"] = int(self.tolerance_entry.get())
+        elif action == "Find Color":
+            params["color"] = self.color_entry.get().strip()
+            params["tolerance"] = int(self.tolerance_entry.get())
+            if self.region_entry.get().strip():
+                params["region"] = [int(v) for v in self.region_entry.get().split(",")]
+            params["click"] = self.click_color_var.get()
         
         return params
 
     def update_step_list(self):
-        self.step_list.delete(0, tk.END)
-        for i, step in enumerate(self.macro_steps):
-            self.step_list.insert(tk.END, f"{i+1}. {step['action']}")
+        self.step_list.reset(self.macro_steps)
 
     def save_macro(self):
         try:
             with open("macro_config.json", "w") as f:
-                json.dump(self.macro_steps, f, indent=4)
+                json.dump(self.macro_steps.to_list(), f, indent=4)
             self.status_var.set("Macro saved successfully")
         except Exception as e:
             self.status_var.set(f"Error saving macro: {str(e)}")
@@ -237,76 +417,121 @@ class MacroRecorder:
         try:
             if os.path.exists("macro_config.json"):
                 with open("macro_config.json", "r") as f:
-                    self.macro_steps = json.load(f)
+                    self.macro_steps = load_step_store(f)
                 self.update_step_list()
                 self.status_var.set("Macro loaded successfully")
+                self.prewarm_browser()
         except Exception as e:
             self.status_var.set(f"Error loading macro: {str(e)}")
 
+    def prewarm_browser(self):
+        """Start the browser in the background if the macro has web steps"""
+        actions = {self.macro_steps.action_names[code] for code in set(self.macro_steps.actions)}
+        if not actions.isdisjoint(WEB_ACTIONS):
+            self.web_pool.prewarm()
+
+    def toggle_recording(self):
+        """Record live input and append it to the macro as steps"""
+        if self.recorder is None or not self.recorder.recording:
+            self.recorder = InputRecorder(os.path.join(self.log_dir, 'recording.bin'))
+            try:
+                self.recorder.start()
+            except Exception as e:
+                self.status_var.set(f"Error starting recording: {str(e)}")
+                return
+            self.record_button.configure(text="Stop Recording")
+            if self.recorder.mouse_hooked:
+                self.status_var.set("Recording keyboard and mouse...")
+            else:
+                self.status_var.set("Recording keyboard only (install 'mouse' for mouse events)...")
+        else:
+            self.recorder.stop()
+            self.record_button.configure(text="Record")
+            steps, report = compress_steps(load_steps(self.recorder.path))
+            self.macro_steps.extend(steps)
+            self.step_list.reset(self.macro_steps)
+            self.status_var.set(
+                f"Recorded {report.summary()} ({self.recorder.dropped} events dropped)")
+
     def run_macro(self):
+        if self.run_thread is not None and self.run_thread.is_alive():
+            self.status_var.set("Macro is already running")
+            return
+        
         self.status_var.set("Running macro...")
-        self.root.update()
         
+        # Validate the whole macro before touching the screen
         try:
-            for i, step in enumerate(self.macro_steps):
-                self.current_step = i
-                self.step_list.selection_clear(0, tk.END)
-                self.step_list.selection_set(i)
-                self.step_list.see(i)
-                
-                self.execute_step(step)
-                
-            self.status_var.set("Macro completed successfully")
-        except Exception as e:
-            self.status_var.set(f"Error running macro: {str(e)}")
+            plan = compile_macro(self.macro_steps, self.reference_store)
+        except MacroValidationError as e:
+            self.status_var.set(f"Macro has {len(e.errors)} invalid step(s)")
+            messagebox.showerror("Invalid Macro", "\n".join(e.errors))
+            return
+        
+        # Play back on a worker thread so the window stays responsive
+        def worker():
+            summary = run_plan(plan, self.context,
+                               on_step=lambda step: self.run_queue.put(("step", step.index)))
+            self.run_queue.put(("done", summary))
+        
+        self.run_thread = threading.Thread(target=worker, daemon=True)
+        self.run_thread.start()
+        self.root.after(50, self.poll_run_queue)
 
-    def execute_step(self, step):
-        action = step["action"]
-        params = step["params"]
-        
-        # Handle reference if present
-        reference = params.get("reference")
-        if reference:
-            self.current_reference = self.load_reference_data(reference["path"], reference["type"])
-        
-        # Execute action
-        if action == "Click Reference Image":
-            if self.current_reference and isinstance(self.current_reference, str):  # Image path
-                location = pyautogui.locateOnScreen(
-                    self.current_reference,
-                    confidence=params.get("confidence", 0.9)
-                )
-                if location:
-                    pyautogui.click(pyautogui.center(location))
+    def poll_run_queue(self):
+        """Apply progress messages from the playback thread on the Tk thread"""
+        done = False
+        while True:
+            try:
+                kind, value = self.run_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "step":
+                self.current_step = value
+                self.step_list.selection_clear(0, tk.END)
+                self.step_list.selection_set(value)
+                self.step_list.see(value)
+            elif kind == "status":
+                self.status_var.set(value)
+            elif kind == "done":
+                done = True
+                if value["status"] == "passed":
+                    cache = value["reference_cache"]
+                    self.status_var.set(
+                        f"Macro completed successfully "
+                        f"(reference cache: {cache['hits']} hits, {cache['misses']} misses; "
+                        f"search area saved: {value['search_area_saved']:.0%})"
+                    )
                 else:
-                    raise Exception(f"Could not find reference image")
-        
-        # ... rest of action handling ...
+                    self.status_var.set(
+                        f"Error running macro at step {value['failed_step']}: {value['error']}")
+        if not done:
+            self.root.after(50, self.poll_run_queue)
 
     def remove_step(self):
         selection = self.step_list.curselection()
         if selection:
             index = selection[0]
             del self.macro_steps[index]
-            self.update_step_list()
+            self.step_list.deleted(index)
 
     def move_step_up(self):
         selection = self.step_list.curselection()
         if selection and selection[0] > 0:
             index = selection[0]
-            self.macro_steps[index], self.macro_steps[index-1] = \
-                self.macro_steps[index-1], self.macro_steps[index]
-            self.update_step_list()
+            self.macro_steps.swap(index, index-1)
+            self.step_list.swapped(index-1, index)
             self.step_list.selection_set(index-1)
+            self.step_list.see(index-1)
 
     def move_step_down(self):
         selection = self.step_list.curselection()
         if selection and selection[0] < len(self.macro_steps) - 1:
             index = selection[0]
-            self.macro_steps[index], self.macro_steps[index+1] = \
-                self.macro_steps[index+1], self.macro_steps[index]
-            self.update_step_list()
+            self.macro_steps.swap(index, index+1)
+            self.step_list.swapped(index, index+1)
             self.step_list.selection_set(index+1)
+            self.step_list.see(index+1)
 
     def preview_reference(self):
         """Preview the selected reference point"""
@@ -400,22 +625,6 @@ class MacroRecorder:
         text_widget.insert('1.0', text)
         text_widget.configure(state='disabled')
 
-    def load_reference_data(self, ref_name, ref_type):
-        """Load reference data based on type"""
-        try:
-            if ref_type == "Image":
-                return ref_name
-            elif ref_type == "Video":
-                return ref_name
-            elif ref_type == "CSS/HTML":
-                return ref_name
-            elif ref_type == "Text":
-                return ref_name
-            elif ref_type == "Coordinates":
-                return ref_name
-        except Exception as e:
-            raise Exception(f"Error loading reference {ref_name}: {str(e)}")
-
     def browse_reference(self):
         """Browse for reference file based on selected type"""
         ref_type = self.ref_type_var.get()
@@ -466,7 +675,7 @@ Macro Recorder Instructions:
 
 1. Reference Sources:
    • Image - For clicking or verifying visual elements
-   • Video - For reviewing complex sequences
+   • Video - For reviewing sequences and waiting for animations to finish
    • CSS/HTML - For web element selection
    • Text - For content verification
    • Coordinates - For specific screen locations
@@ -547,6 +756,8 @@ Works with captured reference points to build automated workflows.
 
     def run(self):
         self.root.mainloop()
+        # Quit the browser kept warm between runs
+        self.web_pool.close()
 
 if __name__ == "__main__":
     app = MacroRecorder()
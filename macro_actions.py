@@ -0,0 +1,218 @@
+"""Action handlers for compiled macro plans.
+
+Each handler takes the ExecutionContext and a PlannedStep. Nothing in here
+imports tkinter, so plans can run headless as well as from the GUI.
+"""
+import time
+
+from color_checks import PixelChecks, find_color, parse_color
+from input_backend import InputBackend
+from macro_plan import action, one_of, Param
+from reference_store import ReferenceTemplate
+from text_entry import STRATEGIES, select_all_verifier
+from video_matcher import wait_for_video
+from web_selectors import step_selector, web_target
+from wait_engine import wait_for_image
+
+
+@action("Click Reference Image", reference="Image",
+        confidence=Param(float, 0.9))
+def click_reference_image(context, step):
+    # The cached frame may predate the previous step's input
+    context.screen.invalidate()
+    location = context.locator.locate(
+        (step.index, step.reference_path),
+        context.screen.frame(),
+        step.reference,
+        confidence=step.params["confidence"]
+    )
+    if location:
+        context.input.click(*_center(location))
+    else:
+        raise Exception("Could not find reference image")
+
+
+@action("Wait for Image", reference="Image",
+        confidence=Param(float, 0.9), timeout=Param(float, 10.0))
+def wait_for_reference_image(context, step):
+    result = wait_for_image(
+        context.screen,
+        step.reference,
+        timeout=step.params["timeout"],
+        confidence=step.params["confidence"],
+        matcher=context.matcher
+    )
+    context.report(f"Wait for Image {result.summary()}")
+    if not result.found:
+        raise Exception("Timed out waiting for reference image")
+
+
+@action("Wait for Video", reference="Video",
+        confidence=Param(float, 0.9), timeout=Param(float, 10.0),
+        min_keyframes=Param(int), settle_polls=Param(int))
+def wait_for_reference_video(context, step):
+    result = wait_for_video(
+        context.screen,
+        step.reference,
+        timeout=step.params["timeout"],
+        confidence=step.params["confidence"],
+        matcher=context.matcher,
+        min_keyframes=step.params["min_keyframes"],
+        settle_polls=step.params["settle_polls"]
+    )
+    context.report(f"Wait for Video {result.summary()}")
+    if not result.found:
+        raise Exception("Timed out waiting for reference video to play through")
+
+
+@action("Wait", seconds=Param(float, 1.0))
+def wait(context, step):
+    time.sleep(step.params["seconds"])
+
+
+@action("Set Input Pace", seconds=Param(float, 0.0))
+def set_input_pace(context, step):
+    context.input.pace = step.params["seconds"]
+
+
+@action("Type Text", text=Param(str, required=True),
+        method=Param(str, "auto", check=one_of(*STRATEGIES)), verify=Param(bool, False))
+def type_text(context, step):
+    engine = context.text_entry
+    engine.verify = select_all_verifier(engine) if step.params["verify"] else None
+    result = engine.type(step.params["text"], step.params["method"])
+    context.report(f"Type Text {result.summary()}")
+
+
+@action("Press Key", key=Param(str, required=True), presses=Param(int, 1),
+        hold=Param(float, 0.0))
+def press_key(context, step):
+    context.input.press(step.params["key"], presses=step.params["presses"],
+                        hold=step.params["hold"])
+
+
+@action("Mouse Move", x=Param(int, required=True), y=Param(int, required=True),
+        duration=Param(float, 0.0))
+def mouse_move(context, step):
+    context.input.move(step.params["x"], step.params["y"], duration=step.params["duration"])
+
+
+def _check_pixel_checks(checks):
+    if not checks:
+        raise ValueError("needs at least one check")
+    PixelChecks(checks)
+
+
+def _check_region(region):
+    if len(region) != 4 or not all(isinstance(v, int) and not isinstance(v, bool) for v in region):
+        raise ValueError("expected [left, top, right, bottom]")
+
+
+@action("Assert Pixels", checks=Param(list, required=True, check=_check_pixel_checks),
+        tolerance=Param(int, 10))
+def assert_pixels(context, step):
+    checks = PixelChecks(step.params["checks"], step.params["tolerance"])
+    context.screen.invalidate()
+    failures = checks.evaluate(context.screen.frame())
+    if failures:
+        _, x, y, expected, actual = failures[0]
+        raise Exception(f"{len(failures)} of {len(checks)} pixel checks failed, first at "
+                        f"({x}, {y}): expected {expected}, got {actual}")
+    context.report(f"{len(checks)} pixel checks passed")
+
+
+@action("Find Color", color=Param(str, required=True, check=parse_color),
+        tolerance=Param(int, 10), region=Param(list, check=_check_region),
+        min_pixels=Param(int, 1), click=Param(bool, False))
+def find_color_on_screen(context, step):
+    region = step.params["region"]
+    context.screen.invalidate()
+    match = find_color(
+        context.screen.frame(),
+        parse_color(step.params["color"]),
+        tolerance=step.params["tolerance"],
+        region=tuple(region) if region else None,
+        min_pixels=step.params["min_pixels"]
+    )
+    if match is None:
+        raise Exception(f"Color {step.params['color']} not found on screen")
+    context.report(f"Found {step.params['color']} at ({match.x}, {match.y}), {match.pixels} pixels")
+    if step.params["click"]:
+        context.input.click(match.x, match.y)
+
+
+def _center(box):
+    """Same point pyautogui.center() gives for a Box"""
+    return box.left + box.width // 2, box.top + box.height // 2
+
+
+def _click_target(context, step):
+    """Explicit x/y wins, then an image reference, then the cursor"""
+    if step.params["x"] is not None and step.params["y"] is not None:
+        return step.params["x"], step.params["y"]
+    if isinstance(step.reference, ReferenceTemplate):
+        context.screen.invalidate()
+        location = context.locator.locate((step.index, step.reference_path),
+                                          context.screen.frame(), step.reference)
+        if location is None:
+            raise Exception("Could not find reference image")
+        return _center(location)
+    return None, None
+
+
+@action("Click", x=Param(int), y=Param(int), hold=Param(float, 0.0),
+        button=Param(str, 'left', check=one_of(*InputBackend.BUTTONS)))
+def click(context, step):
+    x, y = _click_target(context, step)
+    context.input.click(x, y, button=step.params["button"], hold=step.params["hold"])
+
+
+@action("Right Click", x=Param(int), y=Param(int), hold=Param(float, 0.0))
+def right_click(context, step):
+    x, y = _click_target(context, step)
+    context.input.click(x, y, button='right', hold=step.params["hold"])
+
+
+@action("Double Click", x=Param(int), y=Param(int))
+def double_click(context, step):
+    x, y = _click_target(context, step)
+    context.input.click(x, y, clicks=2)
+
+
+@action("Copy Text")
+def copy_text(context, step):
+    context.text_entry.copy()
+
+
+@action("Paste Text", text=Param(str))
+def paste_text(context, step):
+    result = context.text_entry.paste(step.params["text"])
+    if result is not None:
+        context.report(f"Paste Text {result.summary()}")
+
+
+def _click_element(context, step):
+    kind, selector = step_selector(step)
+    context.selectors.click(kind, selector, step.params["timeout"])
+
+
+@action("Open Website", url=Param(str, required=True))
+def open_website(context, step):
+    context.browser.get(step.params["url"])
+
+
+@action("CSS Selector Click", selector=Param(str), timeout=Param(float, 10.0))
+def css_selector_click(context, step):
+    _click_element(context, step)
+
+
+@action("XPath Click", xpath=Param(str), timeout=Param(float, 10.0))
+def xpath_click(context, step):
+    _click_element(context, step)
+
+
+@action("Custom JavaScript", script=Param(str))
+def custom_javascript(context, step):
+    result = context.browser.execute_script(web_target(step, "script"))
+    if result is not None:
+        context.report(f"Custom JavaScript returned {result!r}")
@@ -0,0 +1,217 @@
+"""Post-process recorded macros into fewer, cheaper steps.
+
+    python macro_compress.py recorded.json compressed.json --tolerance 2
+
+Mouse paths are simplified with Ramer-Douglas-Peucker, waits inside a path
+are folded into the moves that survive, adjacent waits are merged and runs
+of the same key are collapsed into one Press Key with a press count.
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from input_backend import INPUT_ACTIONS
+
+# What the Wait action sleeps when it has no seconds parameter
+WAIT_DEFAULT = 1.0
+
+
+def rdp_mask(points, tolerance):
+    """Boolean mask of the points Ramer-Douglas-Peucker keeps.
+
+    ``points`` is an (N, 2) array. Each segment's point distances are
+    computed in one vectorized pass; only the recursion is a Python stack.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    count = len(points)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[start + 1:end]
+        origin = points[start]
+        direction = points[end] - origin
+        length = np.hypot(direction[0], direction[1])
+        offsets = segment - origin
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+class CompressionReport:
+    """Before/after step and input call counts, and the pace time saved"""
+
+    def __init__(self, steps_in, steps_out, inputs_in, inputs_out, per_input_overhead):
+        self.steps_in = steps_in
+        self.steps_out = steps_out
+        self.inputs_in = inputs_in
+        self.inputs_out = inputs_out
+        self.per_input_overhead = per_input_overhead
+
+    @property
+    def ratio(self):
+        return self.steps_in / self.steps_out if self.steps_out else float('inf')
+
+    @property
+    def time_saved(self):
+        """Seconds of per-call input overhead no longer paid at playback"""
+        return (self.inputs_in - self.inputs_out) * self.per_input_overhead
+
+    def summary(self):
+        text = (f"{self.steps_in} -> {self.steps_out} steps ({self.ratio:.1f}x), "
+                f"{self.inputs_in - self.inputs_out} fewer input calls")
+        if self.time_saved > 0:
+            text += f", ~{self.time_saved:.1f}s of input pace saved"
+        return text
+
+
+def _count_inputs(steps):
+    return sum(1 for step in steps if step["action"] in INPUT_ACTIONS)
+
+
+def _simplify_path(run, tolerance):
+    """Simplify one run of Mouse Move/Wait steps that starts with a move"""
+    moves = [i for i, step in enumerate(run) if step["action"] == "Mouse Move"]
+    points = np.array([(run[i]["params"]["x"], run[i]["params"]["y"]) for i in moves])
+    keep = rdp_mask(points, tolerance)
+
+    # Waits in front of a dropped move carry over to the next kept one
+    waits = np.zeros(len(run))
+    for i, step in enumerate(run):
+        if step["action"] == "Wait":
+            waits[i] = _wait_seconds(step)
+    pending = np.cumsum(waits)
+
+    result = []
+    consumed = 0.0
+    for move_number, index in enumerate(moves):
+        if not keep[move_number]:
+            continue
+        waited = pending[index] - consumed
+        consumed = pending[index]
+        if waited > 0:
+            result.append({"action": "Wait", "params": {"seconds": round(float(waited), 3)}})
+        result.append(run[index])
+    trailing = pending[-1] - consumed
+    if trailing > 0:
+        result.append({"action": "Wait", "params": {"seconds": round(float(trailing), 3)}})
+    return result
+
+
+def _is_plain_move(step):
+    return step["action"] == "Mouse Move" and not step["params"].get("reference")
+
+
+def _is_plain_wait(step):
+    return step["action"] == "Wait" and set(step["params"]) <= {"seconds"}
+
+
+def _wait_seconds(step):
+    return step["params"].get("seconds", WAIT_DEFAULT)
+
+
+def simplify_paths(steps, tolerance=2.0):
+    """Replace each run of moves (and the waits between them) by its RDP path"""
+    result = []
+    i = 0
+    while i < len(steps):
+        if not _is_plain_move(steps[i]):
+            result.append(steps[i])
+            i += 1
+            continue
+        end = i
+        while end + 1 < len(steps) and (_is_plain_move(steps[end + 1]) or _is_plain_wait(steps[end + 1])):
+            end += 1
+        # Waits after the last move belong to whatever comes next
+        while not _is_plain_move(steps[end]):
+            end -= 1
+        result.extend(_simplify_path(steps[i:end + 1], tolerance))
+        i = end + 1
+    return result
+
+
+def merge_waits(steps):
+    """Fold adjacent Wait steps into one"""
+    result = []
+    for step in steps:
+        if _is_plain_wait(step) and result and _is_plain_wait(result[-1]):
+            total = _wait_seconds(result[-1]) + _wait_seconds(step)
+            result[-1] = {"action": "Wait", "params": {"seconds": round(total, 3)}}
+        else:
+            result.append(step)
+    return result
+
+
+def collapse_keys(steps):
+    """Turn runs of the same Press Key into one step with a press count.
+
+    Only directly adjacent presses with the same hold are merged; a Wait
+    between two presses keeps them apart.
+    """
+    result = []
+    for step in steps:
+        previous = result[-1] if result else None
+        if (step["action"] == "Press Key" and previous is not None and
+                previous["action"] == "Press Key" and
+                previous["params"]["key"] == step["params"]["key"] and
+                step["params"].get("hold", 0.0) == previous["params"].get("hold", 0.0) and
+                not step["params"].get("reference") and not previous["params"].get("reference")):
+            presses = previous["params"].get("presses", 1) + step["params"].get("presses", 1)
+            result[-1] = {"action": "Press Key",
+                          "params": dict(previous["params"], presses=presses)}
+        else:
+            result.append(step)
+    return result
+
+
+def compress_steps(steps, tolerance=2.0, per_input_overhead=0.0):
+    """Run the whole pipeline and return (steps, CompressionReport).
+
+    ``per_input_overhead`` is what each input call costs at playback,
+    i.e. the input backend's pace; with the default of 0 the report only
+    counts the input calls saved.
+    """
+    steps = [dict(step, params=dict(step.get("params") or {})) for step in steps]
+    compressed = collapse_keys(merge_waits(simplify_paths(steps, tolerance)))
+    report = CompressionReport(len(steps), len(compressed), _count_inputs(steps),
+                               _count_inputs(compressed), per_input_overhead)
+    return compressed, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress a recorded macro")
+    parser.add_argument('source')
+    parser.add_argument('dest')
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help="maximum path deviation in pixels")
+    parser.add_argument('--pace', type=float, default=0.0,
+                        help="input pace in seconds the macro plays back with, "
+                             "to estimate the time saved")
+    args = parser.parse_args(argv)
+
+    with open(args.source, 'r') as f:
+        steps = json.load(f)
+    compressed, report = compress_steps(steps, args.tolerance, args.pace)
+    with open(args.dest, 'w') as f:
+        json.dump(compressed, f, indent=4)
+    print(report.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+import collections
+import json
+import os
+import time
+import types
+
+from input_backend import INPUT_ACTIONS, create_input_backend
+from macro_stream import MacroStream
+from reference_store import ReferenceStore
+from screen_source import create_screen_source
+from template_matcher import PyramidMatcher, CoherentLocator
+from text_entry import TextEntryEngine
+from web_selectors import SelectorResolver, selector_runs, step_selector
+from web_session import WebSessionPool
+from video_matcher import load_keyframes
+
+# Action name -> ActionSpec, filled in by the @action decorator
+ACTIONS = {}
+
+REFERENCE_TYPES = ("Image", "Video", "CSS/HTML", "Text", "Coordinates")
+
+
+class MacroValidationError(Exception):
+    """Raised when a macro cannot be compiled; lists every bad step"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Invalid macro:\n" + "\n".join(errors))
+
+
+class Param:
+    """Type and default for one action parameter.
+
+    ``check`` is called with the coerced value at compile time and raises
+    ValueError for values the type alone does not rule out.
+    """
+    __slots__ = ('type', 'default', 'required', 'check')
+
+    def __init__(self, type, default=None, required=False, check=None):
+        self.type = type
+        self.default = default
+        self.required = required
+        self.check = check
+
+    def coerce(self, value):
+        value = self._coerce_type(value)
+        if self.check is not None:
+            self.check(value)
+        return value
+
+    def _coerce_type(self, value):
+        if self.type is float and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if self.type is int and isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if self.type is str and isinstance(value, str):
+            return value
+        if self.type in (list, dict, bool) and isinstance(value, self.type):
+            return value
+        raise ValueError(f"expected {self.type.__name__}, got {type(value).__name__}")
+
+
+class ActionSpec:
+    """Handler plus the parameters and reference type an action accepts"""
+    __slots__ = ('name', 'handler', 'params', 'reference')
+
+    def __init__(self, name, handler, params, reference):
+        self.name = name
+        self.handler = handler
+        self.params = params
+        self.reference = reference
+
+
+def one_of(*choices):
+    """Param check that only accepts the given values"""
+    def check(value):
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(map(repr, choices))}, got {value!r}")
+    return check
+
+
+def action(name, reference=None, **params):
+    """Register a handler(context, step) for an action name"""
+    def register(handler):
+        ACTIONS[name] = ActionSpec(name, handler, params, reference)
+        return handler
+    return register
+
+
+# One compiled step: params are read-only and the reference is already resolved
+PlannedStep = collections.namedtuple(
+    'PlannedStep', 'index action handler params reference reference_path')
+
+
+class MacroPlan(tuple):
+    """Immutable, validated sequence of PlannedSteps"""
+
+    @property
+    def actions(self):
+        return [step.action for step in self]
+
+    def close(self):
+        """Nothing to release; here so every plan can be closed the same way"""
+
+
+def resolve_reference(reference, references):
+    """Turn a step's reference dict into a ready-to-use handle"""
+    ref_type = reference.get("type")
+    path = reference.get("path")
+    if ref_type not in REFERENCE_TYPES:
+        raise ValueError(f"unknown reference type {ref_type!r}")
+    if not path or not os.path.exists(path):
+        raise ValueError(f"{ref_type} reference not found: {path}")
+    if ref_type == "Image":
+        return references.get(path)
+    if ref_type == "Video":
+        return references.get(path, load_keyframes)
+    return path
+
+
+def compile_step(index, step, references):
+    """Compile one raw step dict, raising ValueError on the first problem"""
+    if not isinstance(step, dict) or "action" not in step:
+        raise ValueError("step must be an object with an 'action'")
+    spec = ACTIONS.get(step["action"])
+    if spec is None:
+        raise ValueError(f"unknown action {step['action']!r}")
+
+    raw = dict(step.get("params") or {})
+    reference = raw.pop("reference", None)
+    params = {}
+    for name, param in spec.params.items():
+        if name in raw:
+            try:
+                params[name] = param.coerce(raw.pop(name))
+            except ValueError as e:
+                raise ValueError(f"parameter {name!r}: {e}")
+        elif param.required:
+            raise ValueError(f"missing parameter {name!r}")
+        else:
+            params[name] = param.default
+    if raw:
+        raise ValueError(f"unexpected parameters: {', '.join(sorted(raw))}")
+
+    handle = path = None
+    if reference:
+        handle = resolve_reference(reference, references)
+        path = reference["path"]
+    if spec.reference and (not reference or reference.get("type") != spec.reference):
+        raise ValueError(f"{spec.name} needs an {spec.reference} reference")
+
+    return PlannedStep(index, spec.name, spec.handler,
+                       types.MappingProxyType(params), handle, path)
+
+
+class StreamedPlan:
+    """Plan over a MacroStream: validated up front, compiled step by step.
+
+    Only one step is held in memory at a time during playback, which keeps
+    macros with hundreds of thousands of steps cheap to run.
+    """
+
+    def __init__(self, stream, references):
+        self.stream = stream
+        self.references = references
+
+    def __len__(self):
+        return len(self.stream)
+
+    def __iter__(self):
+        for index, step in enumerate(self.stream):
+            yield compile_step(index, step, self.references)
+
+    def close(self):
+        self.stream.close()
+
+
+def _compile_all(steps, references, keep=True):
+    # Handlers register themselves on import
+    import macro_actions  # noqa: F401
+
+    planned = []
+    errors = []
+    for index, step in enumerate(steps):
+        try:
+            compiled = compile_step(index, step, references)
+            if keep:
+                planned.append(compiled)
+        except Exception as e:
+            errors.append(f"Step {index + 1}: {e}")
+    if errors:
+        raise MacroValidationError(errors)
+    return planned
+
+
+def compile_macro(steps, references=None):
+    """Validate every step up front and return a MacroPlan.
+
+    All problems are collected so one run of the compiler reports every
+    broken step instead of failing halfway through playback.
+    """
+    return MacroPlan(_compile_all(steps, references or ReferenceStore()))
+
+
+def compile_stream(stream, references=None):
+    """Validate a MacroStream in one pass and return a StreamedPlan"""
+    references = references or ReferenceStore()
+    _compile_all(stream, references, keep=False)
+    return StreamedPlan(stream, references)
+
+
+def load_plan(path, references=None):
+    """Compile a macro_config.json style file or a .jsonl stream macro"""
+    if path.endswith('.jsonl'):
+        stream = MacroStream(path)
+        try:
+            return compile_stream(stream, references)
+        except Exception:
+            stream.close()
+            raise
+    with open(path, "r") as f:
+        steps = json.load(f)
+    return compile_macro(steps, references)
+
+
+class ExecutionContext:
+    """Everything the action handlers share while a plan runs.
+
+    The input backend is created on first use, so validating a macro does
+    not need a display to send input to. Web steps borrow one browser from
+    ``web_pool`` for the rest of the run; it goes back to the pool when the
+    plan finishes, so the next run starts warm. CSS/XPath lookups on that
+    browser go through ``selectors``, which caches them per DOM epoch.
+    Text steps share ``text_entry``, so the clipboard is probed only once.
+    """
+
+    def __init__(self, screen=None, references=None, matcher=None, report=None,
+                 input=None, web_pool=None):
+        self.screen = screen or create_screen_source()
+        self.references = references or ReferenceStore()
+        self.matcher = matcher or PyramidMatcher()
+        self.locator = CoherentLocator(self.matcher)
+        self.report = report or (lambda message: None)
+        self._input = input
+        self._web_pool = web_pool
+        self._web_session = None
+        self._selectors = None
+        self._text_entry = None
+
+    @property
+    def input(self):
+        if self._input is None:
+            self._input = create_input_backend()
+        return self._input
+
+    @input.setter
+    def input(self, backend):
+        self._input = backend
+
+    @property
+    def text_entry(self):
+        if self._text_entry is None or self._text_entry.input is not self.input:
+            self._text_entry = TextEntryEngine(self.input)
+        return self._text_entry
+
+    def flush_input(self):
+        """Deliver queued input before something looks at the screen"""
+        if self._input is not None:
+            self._input.flush()
+
+    @property
+    def web_pool(self):
+        if self._web_pool is None:
+            self._web_pool = WebSessionPool()
+        return self._web_pool
+
+    @property
+    def browser(self):
+        """The WebDriver this run uses, taken from the pool on first use"""
+        if self._web_session is None:
+            self._web_session = self.web_pool.acquire()
+        return self._web_session.driver
+
+    @property
+    def selectors(self):
+        driver = self.browser
+        if self._selectors is None or self._selectors.driver is not driver:
+            self._selectors = SelectorResolver(driver)
+        return self._selectors
+
+    def prefetch_selectors(self, steps):
+        """Resolve the selectors of a run of web steps in one round trip"""
+        targets = []
+        for step in steps:
+            try:
+                targets.append(step_selector(step))
+            except Exception:
+                # The step reports its own error when it runs
+                pass
+        if targets:
+            self.selectors.prefetch(targets)
+
+    def release_browser(self):
+        if self._web_session is not None:
+            session, self._web_session = self._web_session, None
+            self.web_pool.release(session)
+
+    def close(self):
+        """Quit any browsers this context started; one-shot runners call this"""
+        self.release_browser()
+        if self._web_pool is not None:
+            self._web_pool.close()
+
+
+def execute_plan(plan, context, on_step=None):
+    """Run each planned step through its pre-resolved handler.
+
+    Consecutive input-only steps share one batch of input events; it is
+    flushed before any step that reads the screen and at the end. The
+    selectors of consecutive CSS/XPath steps are resolved together when
+    the first of them runs.
+    """
+    # Set Input Pace lasts for one run; contexts are reused across macros
+    if context._input is not None:
+        context._input.pace = context._input.default_pace
+    try:
+        for step, run in selector_runs(plan):
+            if step.action not in INPUT_ACTIONS or step.reference is not None:
+                context.flush_input()
+            if on_step:
+                on_step(step)
+            if run:
+                context.prefetch_selectors(run)
+            step.handler(context, step)
+    finally:
+        context.flush_input()
+        context.release_browser()
+
+
+def run_plan(plan, context, on_step=None):
+    """Execute a plan and return a JSON-serialisable result summary"""
+    summary = {
+        "status": "passed",
+        "steps_total": len(plan),
+        "steps_run": 0,
+        "failed_step": None,
+        "error": None
+    }
+
+    def track(step):
+        summary["steps_run"] = step.index + 1
+        if on_step:
+            on_step(step)
+
+    start = time.perf_counter()
+    try:
+        execute_plan(plan, context, on_step=track)
+    except Exception as e:
+        summary["status"] = "failed"
+        summary["failed_step"] = summary["steps_run"]
+        summary["error"] = str(e)
+    summary["duration"] = round(time.perf_counter() - start, 3)
+    summary["reference_cache"] = context.references.stats()
+    summary["search_area_saved"] = round(context.locator.area_saved(), 3)
+    if context._input is not None:
+        summary["input"] = context.input.stats()
+    if context._web_pool is not None:
+        summary["browser_pool"] = context.web_pool.stats()
+    if context._selectors is not None:
+        summary["selectors"] = context._selectors.stats()
+    return summary
@@ -0,0 +1,215 @@
+"""Line-oriented macro files for very large macros.
+
+A stream macro is a ``.jsonl`` file holding one compact JSON step per line
+plus a ``.jsonl.idx`` sidecar with the byte offset of every step. The data
+file is append-only: edits append the new step and repoint the index, so
+the index defines step order. ``compact()`` rewrites both files cleanly.
+
+    python macro_stream.py to-stream macro_config.json macro.jsonl
+    python macro_stream.py to-json macro.jsonl macro_config.json
+"""
+import array
+import json
+import os
+import struct
+import sys
+
+INDEX_MAGIC = b'MFIDX1\x00\x00'
+# magic, data file size the index describes, flags
+INDEX_HEADER = struct.Struct('<8sQQ')
+FLAG_EDITED = 1
+
+
+def encode_step(step):
+    return (json.dumps(step, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class MacroStream:
+    """Random access and streaming over a .jsonl macro and its offset index"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.offsets = array.array('Q')
+        self.flags = 0
+        if not os.path.exists(path):
+            open(path, 'wb').close()
+        self._data = open(path, 'r+b')
+        self._load_index()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.offsets)
+        self._data.seek(self.offsets[index])
+        return json.loads(self._data.readline())
+
+    def __iter__(self):
+        """Yield steps one at a time without loading the whole file"""
+        with open(self.path, 'rb') as f:
+            position = 0
+            for offset in self.offsets:
+                if offset != position:
+                    f.seek(offset)
+                line = f.readline()
+                position = offset + len(line)
+                yield json.loads(line)
+
+    def append(self, step):
+        """Add a step at the end; only the new line and offset are written"""
+        self.offsets.append(self._write(step))
+        if self.flags & FLAG_EDITED:
+            self._save_index()
+        else:
+            with open(self.index_path, 'r+b') as f:
+                f.seek(0, os.SEEK_END)
+                f.write(struct.pack('<Q', self.offsets[-1]))
+                self._write_header(f)
+
+    def extend(self, steps):
+        for step in steps:
+            self.offsets.append(self._write(step))
+        self._save_index()
+
+    def replace(self, index, step):
+        self.offsets[index] = self._write(step)
+        self._edited()
+
+    def replace_many(self, edits):
+        """Replace several (index, step) pairs, saving the index once"""
+        edits = list(edits)
+        for index, step in edits:
+            self.offsets[index] = self._write(step)
+        if edits:
+            self._edited()
+
+    def insert(self, index, step):
+        self.offsets.insert(index, self._write(step))
+        self._edited()
+
+    def delete(self, index):
+        del self.offsets[index]
+        self._edited()
+
+    def swap(self, first, second):
+        self.offsets[first], self.offsets[second] = self.offsets[second], self.offsets[first]
+        self._edited()
+
+    def compact(self):
+        """Rewrite the data file in index order, dropping superseded lines"""
+        temp_path = self.path + '.tmp'
+        offsets = array.array('Q')
+        with open(temp_path, 'wb') as out:
+            for step in self:
+                offsets.append(out.tell())
+                out.write(encode_step(step))
+        self._data.close()
+        os.replace(temp_path, self.path)
+        self._data = open(self.path, 'r+b')
+        self.offsets = offsets
+        self.flags = 0
+        self._save_index()
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, step):
+        self._data.seek(0, os.SEEK_END)
+        offset = self._data.tell()
+        self._data.write(encode_step(step))
+        self._data.flush()
+        return offset
+
+    def _edited(self):
+        self.flags |= FLAG_EDITED
+        self._save_index()
+
+    def _data_size(self):
+        return os.fstat(self._data.fileno()).st_size
+
+    def _write_header(self, f):
+        f.seek(0)
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, self._data_size(), self.flags))
+
+    def _save_index(self):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            self._write_header(f)
+            self.offsets.tofile(f)
+        os.replace(temp_path, self.index_path)
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                magic, size, flags = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                body = f.read()
+            if magic == INDEX_MAGIC and size == self._data_size():
+                self.flags = flags
+                self.offsets.frombytes(body)
+                return
+            if magic == INDEX_MAGIC and flags & FLAG_EDITED:
+                raise Exception(f"Index for edited macro {self.path} is out of date")
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Scan the data file; only valid while steps are stored in order"""
+        self.offsets = array.array('Q')
+        self._data.seek(0)
+        offset = 0
+        for line in self._data:
+            if line.strip():
+                self.offsets.append(offset)
+            offset += len(line)
+        self.flags = 0
+        self._save_index()
+
+
+def json_to_stream(json_path, stream_path):
+    """Convert a macro_config.json style list into a stream macro"""
+    with open(json_path, 'r') as f:
+        steps = json.load(f)
+    for path in (stream_path, stream_path + '.idx'):
+        if os.path.exists(path):
+            os.remove(path)
+    with MacroStream(stream_path) as stream:
+        stream.extend(steps)
+    return len(steps)
+
+
+def stream_to_json(stream_path, json_path):
+    """Write a stream macro back out exactly as save_macro would.
+
+    Steps are written one at a time, producing the same bytes as
+    json.dump(steps, f, indent=4) without holding every step in memory.
+    """
+    count = 0
+    with MacroStream(stream_path) as stream, open(json_path, 'w') as f:
+        for step in stream:
+            text = json.dumps(step, indent=4).replace('\n', '\n    ')
+            f.write(('[\n    ' if count == 0 else ',\n    ') + text)
+            count += 1
+        f.write('\n]' if count else '[]')
+    return count
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] not in ('to-stream', 'to-json'):
+        print("usage: macro_stream.py to-stream|to-json SOURCE DEST")
+        return 2
+    command, source, dest = argv
+    convert = json_to_stream if command == 'to-stream' else stream_to_json
+    print(f"Converted {convert(source, dest)} steps to {dest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""Run many macros in parallel, one Xvfb virtual display per worker.
+
+    python pool_runner.py jobs.json --workers 4
+
+jobs.json is a list of macro paths or objects like
+{"macro": "login.json", "setup": ["./app", "--input", "case1.csv"]}.
+The optional setup command is started inside the worker's display before
+the macro runs and is terminated afterwards.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import queue
+import signal
+import sys
+import time
+
+
+class VirtualDisplay:
+    """An Xvfb server on display :number.
+
+    The display only counts as started once the Xvfb process launched here
+    is running and holds the display's lock file, so a display number that
+    is already taken (or a stale socket left behind) is reported instead of
+    silently driving somebody else's server.
+    """
+
+    def __init__(self, number, size=(1920, 1080), xvfb='Xvfb', start_timeout=10.0):
+        self.number = number
+        self.size = size
+        self.xvfb = xvfb
+        self.start_timeout = start_timeout
+        self.process = None
+
+    @property
+    def name(self):
+        return f":{self.number}"
+
+    @property
+    def lock_path(self):
+        return f'/tmp/.X{self.number}-lock'
+
+    def lock_owner(self):
+        """PID recorded in the display's lock file, or None"""
+        try:
+            with open(self.lock_path, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def start(self):
+        owner = self.lock_owner()
+        if owner is not None and _pid_alive(owner):
+            raise Exception(f"Display {self.name} is already in use by process {owner}")
+        width, height = self.size
+        self.process = subprocess.Popen(
+            [self.xvfb, self.name, '-screen', '0', f'{width}x{height}x24', '-nolisten', 'tcp'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        # Ready once our server owns the lock and has created its socket;
+        # Xvfb clears stale locks and sockets itself before taking them
+        socket_path = f'/tmp/.X11-unix/X{self.number}'
+        deadline = time.monotonic() + self.start_timeout
+        while not (self.lock_owner() == self.process.pid and os.path.exists(socket_path)):
+            if self.process.poll() is not None:
+                self.process = None
+                raise Exception(f"Xvfb exited while starting display {self.name}")
+            if time.monotonic() > deadline:
+                self.stop()
+                raise Exception(f"Timed out starting display {self.name}")
+            time.sleep(0.05)
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def normalize_job(job):
+    if isinstance(job, str):
+        return {"macro": job}
+    return dict(job)
+
+
+def worker_main(display_number, size, xvfb, jobs, results):
+    """Worker process: own display, own screen and input backends"""
+    # Turn terminate() into an exception so the display is still stopped
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    display = VirtualDisplay(display_number, size, xvfb)
+    try:
+        display.start()
+        results.put(("display_started", display_number, display.process.pid))
+        # pyautogui binds to DISPLAY on import, so set it before any handler loads
+        os.environ['DISPLAY'] = display.name
+        from macro_plan import ExecutionContext
+        from screen_source import X11ScreenSource
+
+        context = ExecutionContext(screen=X11ScreenSource(display.name))
+        try:
+            run_jobs(context, jobs, results, display)
+        finally:
+            context.close()
+        results.put(("worker_done", display_number, None))
+    except Exception as e:
+        results.put(("worker_error", display_number, str(e)))
+    finally:
+        display.stop()
+
+
+def run_jobs(context, jobs, results, display):
+    """Take jobs off the queue until the None sentinel and report each one"""
+    from macro_plan import load_plan, run_plan, MacroValidationError
+
+    while True:
+        item = jobs.get()
+        if item is None:
+            break
+        index, job = item
+        result = {"job": index, "macro": job["macro"], "display": display.name}
+        setup = plan = None
+        start = time.perf_counter()
+        try:
+            if job.get("setup"):
+                setup = subprocess.Popen(job["setup"], env=dict(os.environ))
+            plan = load_plan(job["macro"], context.references)
+            context.locator.forget()
+            result.update(run_plan(plan, context))
+        except MacroValidationError as e:
+            result.update(status="invalid", errors=e.errors)
+        except Exception as e:
+            result.update(status="error", error=str(e))
+        finally:
+            if plan is not None:
+                plan.close()
+            if setup is not None and setup.poll() is None:
+                setup.terminate()
+                setup.wait()
+        result["wall_time"] = round(time.perf_counter() - start, 3)
+        results.put(("result", index, result))
+
+
+class MacroPool:
+    """Shard macro jobs across worker processes, each on its own display"""
+
+    def __init__(self, workers=None, first_display=100, size=(1920, 1080), xvfb='Xvfb',
+                 poll_interval=1.0):
+        self.workers = workers or os.cpu_count()
+        self.first_display = first_display
+        self.size = size
+        self.xvfb = xvfb
+        self.poll_interval = poll_interval
+
+    def _reap_display(self, number, pid):
+        """Stop the Xvfb left behind by a worker that was killed outright"""
+        if pid is None or VirtualDisplay(number).lock_owner() != pid:
+            return
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def run(self, jobs):
+        """Run every job and return a summary with per-job results in order"""
+        jobs = [normalize_job(job) for job in jobs]
+        # spawn gives each worker a fresh interpreter with its own DISPLAY
+        ctx = multiprocessing.get_context('spawn')
+        job_queue = ctx.Queue()
+        result_queue = ctx.Queue()
+        for item in enumerate(jobs):
+            job_queue.put(item)
+
+        worker_count = max(1, min(self.workers, len(jobs)))
+        for _ in range(worker_count):
+            job_queue.put(None)
+
+        start = time.perf_counter()
+        processes = {
+            self.first_display + i: ctx.Process(
+                target=worker_main,
+                args=(self.first_display + i, self.size, self.xvfb, job_queue, result_queue))
+            for i in range(worker_count)
+        }
+        for process in processes.values():
+            process.start()
+
+        results = [None] * len(jobs)
+        errors = []
+        servers = {}
+        pending = len(jobs)
+        live = set(processes)
+        while pending and live:
+            try:
+                kind, key, payload = result_queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                # A worker killed outright never reports back
+                for number in list(live):
+                    process = processes[number]
+                    if not process.is_alive():
+                        errors.append(f"display :{number}: worker exited with code "
+                                      f"{process.exitcode}")
+                        live.discard(number)
+                        self._reap_display(number, servers.get(number))
+                continue
+            if kind == "display_started":
+                servers[key] = payload
+            elif kind == "result":
+                results[key] = payload
+                pending -= 1
+            elif kind == "worker_done":
+                live.discard(key)
+            else:
+                errors.append(f"display :{key}: {payload}")
+                live.discard(key)
+
+        for process in processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {"job": index, "macro": jobs[index]["macro"],
+                                  "status": "not_run"}
+        wall_time = time.perf_counter() - start
+        return {
+            "workers": worker_count,
+            "wall_time": round(wall_time, 3),
+            "jobs_per_second": round(len(jobs) / wall_time, 3) if wall_time else None,
+            "passed": sum(1 for r in results if r.get("status") == "passed"),
+            "worker_errors": errors,
+            "results": results
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run macros in parallel on Xvfb displays")
+    parser.add_argument('jobs', help="JSON file with a list of macro jobs")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--first-display', type=int, default=100)
+    parser.add_argument('--size', default='1920x1080', help="virtual screen size")
+    args = parser.parse_args(argv)
+
+    with open(args.jobs, 'r') as f:
+        jobs = json.load(f)
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    summary = MacroPool(args.workers, args.first_display, (width, height)).run(jobs)
+    print(json.dumps(summary, indent=4))
+    return 0 if summary["passed"] == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
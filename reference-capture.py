@@ -1,16 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import pyautogui
-import time
 import os
 import cv2
 import keyboard
-from PIL import Image, ImageGrab, ImageTk
+from PIL import Image, ImageTk
 import win32gui
 import win32con
 import sys
 import json
+import queue
 import numpy as np
+from screen_source import create_screen_source
+from cursor_probe import CursorProbe
+from reference_index import ReferenceIndex
+from reference_dedup import ReferenceDeduplicator
+from capture_writer import CaptureWriter
+from video_recorder import VideoRecorder
 
 # Hide console window on launch
 if sys.platform == 'win32':
@@ -56,6 +62,25 @@ class ReferenceImageCaptureGUI:
                 
         self.capturing = False
         self.current_element = None
+        self.recording = False
+        self.video_recorder = None
+        
+        # Metadata index so listing captures never decodes the images
+        self.reference_index = ReferenceIndex(self.save_dir)
+        self.deduplicator = ReferenceDeduplicator(self.reference_index)
+        self.deduplicator.prewarm()
+        
+        # Captures are encoded and written off the UI thread
+        self.capture_writer = self.create_capture_writer()
+        self.capture_poll_pending = False
+        
+        # One screen grabber shared by the color panel and captures
+        self.screen = create_screen_source()
+        
+        # Reads just the pixel under the cursor and only pushes changes
+        self.cursor_probe = CursorProbe(self.screen, pyautogui.position,
+                                        on_position=self.show_cursor_position,
+                                        on_color=self.show_cursor_color)
         
         self.setup_ui()
         self.setup_keyboard_listener()
@@ -195,6 +220,14 @@ class ReferenceImageCaptureGUI:
                                       bg=self.colors['button'], fg=self.colors['fg'])
         self.capture_button.pack(side=tk.TOP, pady=1, fill=tk.X)
         
+        # Near-duplicate captures reuse the existing file instead of adding one
+        self.merge_duplicates = tk.BooleanVar(value=True)
+        tk.Checkbutton(button_frame, text="Skip duplicate captures",
+                      variable=self.merge_duplicates,
+                      bg=self.colors['bg'], fg=self.colors['fg'],
+                      selectcolor=self.colors['frame'],
+                      activebackground=self.colors['bg']).pack(side=tk.TOP, anchor='w')
+        
         # Other buttons
         tk.Button(button_frame, text="Show Images",
                  command=self.show_captured_images,
@@ -203,9 +236,21 @@ class ReferenceImageCaptureGUI:
                  command=self.launch_macro,
                  bg=self.colors['button'], fg=self.colors['fg']).pack(side=tk.TOP, pady=1, fill=tk.X)
 
-        # Right column (empty space)
+        # Right column: reference search and thumbnail preview
         right_column = tk.Frame(content_frame, bg=self.colors['bg'])
         right_column.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
+        
+        search_frame = tk.Frame(right_column, bg=self.colors['bg'])
+        search_frame.pack(fill=tk.X, pady=2)
+        tk.Label(search_frame, text="Search", width=10, anchor='w',
+                bg=self.colors['bg'], fg=self.colors['fg']).pack(side=tk.LEFT)
+        self.search_entry = tk.Entry(search_frame, bg=self.colors['frame'], fg=self.colors['fg'])
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.search_entry.bind('<Return>', lambda e: self.show_captured_images())
+        
+        self.preview_canvas = tk.Canvas(right_column, width=64, height=64,
+                                      bg=self.colors['frame'], highlightthickness=0)
+        self.preview_canvas.pack(side=tk.TOP, anchor='w', pady=2)
 
         # Status text area below both columns
         self.status_text = tk.Text(self.root, height=6, bg=self.colors['frame'], fg=self.colors['fg'])
@@ -232,6 +277,17 @@ class ReferenceImageCaptureGUI:
         self.screenshot_path.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         tk.Button(screenshot_frame, text="Save Screenshot",
                  bg=self.colors['button'], fg=self.colors['fg']).pack(side=tk.RIGHT)
+        
+        # Video recording (third)
+        recording_frame = tk.Frame(save_frame, bg=self.colors['bg'])
+        recording_frame.pack(fill=tk.X, pady=2)
+        self.recording_path = tk.Entry(recording_frame, bg=self.colors['frame'], fg=self.colors['fg'])
+        self.recording_path.insert(0, os.path.join(self.video_dir, "recording.mp4"))
+        self.recording_path.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+        self.record_button = tk.Button(recording_frame, text="Record Video (F9)",
+                                       command=self.toggle_recording,
+                                       bg=self.colors['button'], fg=self.colors['fg'])
+        self.record_button.pack(side=tk.RIGHT)
 
     def copy_value(self, value):
         self.root.clipboard_clear()
@@ -286,6 +342,12 @@ import win32con
 import sys
 from PIL import ImageGrab
 
+# Engines live next to the capture tool
+sys.path.insert(0, __TOOL_DIR__)
+from reference_store import ReferenceStore
+from template_matcher import CoherentLocator, BatchLocator
+from screen_source import create_screen_source
+
 # Hide console window
 if sys.platform == 'win32':
     console_window = win32gui.GetForegroundWindow()
@@ -294,6 +356,10 @@ if sys.platform == 'win32':
 class MacroRunner:
     def __init__(self):
         self.load_config()
+        self.references = ReferenceStore()
+        self.locator = CoherentLocator()
+        self.batch = BatchLocator(self.locator)
+        self.screen = create_screen_source()
         
     def load_config(self):
         with open('ref_config.json', 'r') as f:
@@ -314,8 +380,10 @@ class MacroRunner:
     def find_and_click(self, element_name, confidence=0.8):
         """Find and click an element using its reference image"""
         try:
-            location = pyautogui.locateOnScreen(f'ref_images/{element_name}.png', 
-                                              confidence=confidence)
+            template = self.references.get(f'ref_images/{element_name}.png')
+            # Looks around the last hit first, full screen only on a miss
+            location = self.locator.locate(element_name, self.screen.frame(),
+                                           template, confidence=confidence)
             if location:
                 center = pyautogui.center(location)
                 pyautogui.click(center)
@@ -332,18 +400,38 @@ class MacroRunner:
             
         time.sleep(1)  # Wait for window to focus
         
+        # Load every element's reference up front
+        templates = {}
+        for element_name in self.config['elements']:
+            try:
+                templates[element_name] = self.references.get(f'ref_images/{element_name}.png')
+            except Exception as e:
+                print(f"Error loading {element_name}: {e}")
+        
+        # One screen grab for the whole page, matched in parallel
+        locations = self.batch.locate_all(self.screen.frame(), templates,
+                                          confidence=0.8)
+        
         # Example macro sequence using captured reference points
         for element_name in self.config['elements']:
-            if self.find_and_click(element_name):
+            location = locations.get(element_name)
+            if location:
+                pyautogui.click(pyautogui.center(location))
                 print(f"Clicked {element_name}")
                 time.sleep(0.5)
             else:
                 print(f"Could not find {element_name}")
+        
+        for element_name, stats in self.locator.stats().items():
+            print(f"{element_name}: {stats['hits']} local hits, "
+                  f"{stats['fallbacks']} full-screen fallbacks, "
+                  f"{stats.get('area_saved', 0.0):.0%} search area saved")
 
 if __name__ == "__main__":
     runner = MacroRunner()
     runner.run()
 '''
+        macro_code = macro_code.replace('__TOOL_DIR__', repr(self.script_dir))
         with open('macro_runner.py', 'w') as f:
             f.write(macro_code.strip())
     
@@ -358,6 +446,9 @@ if __name__ == "__main__":
         # Window toggling
         self.root.bind('<Alt-Tab>', self.toggle_window_focus)
         self.root.bind('<F11>', self.toggle_window_focus)
+        
+        # Start/stop video recording around the cursor
+        self.root.bind('<F9>', self.toggle_recording)
 
     def toggle_capture(self):
         """Toggle capture mode on/off"""
@@ -425,26 +516,35 @@ if __name__ == "__main__":
             x, y = pyautogui.position()
             
             # Define capture region (20x20 pixels around cursor)
-            region = (x-10, y-10, 20, 20)
+            region = (x-10, y-10, x+10, y+10)
             
             # Temporarily hide cursor for clean capture
             pyautogui.FAILSAFE = False
             original_visibility = win32gui.ShowCursor(False)
             
-            # Capture the region
-            screenshot = ImageGrab.grab(bbox=region)
+            # Capture just the region from a fresh frame
+            screenshot = self.screen.grab_region(region)
             
             # Restore cursor
             win32gui.ShowCursor(True)
             pyautogui.FAILSAFE = True
             
-            # Save the capture
-            timestamp = time.strftime("%Y%m%d-%H%M%S")
-            filename = f"capture_{timestamp}.png"
-            save_path = os.path.join(self.save_dir, filename)
-            screenshot.save(save_path)
+            duplicate = self.deduplicator.find(screenshot)
+            if duplicate is not None and self.merge_duplicates.get():
+                self.update_status(f"Captured region at ({x}, {y}) matches {duplicate.name} - not saved")
+                return "break"
+            
+            # Queue the capture; the writer pool encodes and saves it
+            filename = os.path.basename(self.capture_writer.submit(screenshot))
+            if not self.capture_poll_pending:
+                self.capture_poll_pending = True
+                self.root.after(200, self.check_capture_writer)
             
-            self.update_status(f"Captured region at ({x}, {y}) - saved as {filename}")
+            if duplicate is not None:
+                self.update_status(f"Captured region at ({x}, {y}) - saving as {filename} "
+                                   f"(looks like {duplicate.name})")
+            else:
+                self.update_status(f"Captured region at ({x}, {y}) - saving as {filename}")
             
         except Exception as e:
             self.update_status(f"Capture failed: {str(e)}")
@@ -454,6 +554,37 @@ if __name__ == "__main__":
             pyautogui.FAILSAFE = True
             return "break"  # Prevent event from propagating
 
+    def create_capture_writer(self):
+        # Captures are hashed as they are queued, so the next ones in a burst
+        # can match them, and indexed once they are saved
+        return CaptureWriter(self.save_dir, workers=2, image_format='png', compression=3,
+                             on_submitted=lambda path, image: self.deduplicator.reserve(path, image),
+                             on_saved=lambda submitted, path, image:
+                                 self.deduplicator.add(path, image, reserved=submitted))
+
+    def check_capture_writer(self):
+        """Report failed writes and keep polling while captures are queued"""
+        # Read pending first: a write that finishes after this has still
+        # been counted, and one that finished before has its result queued
+        pending = self.capture_writer.pending
+        while True:
+            try:
+                submitted, path, error = self.capture_writer.results.get_nowait()
+            except queue.Empty:
+                break
+            if error is None:
+                continue
+            self.deduplicator.discard(submitted)
+            if path is None:
+                self.update_status(f"Saving {os.path.basename(submitted)} failed: {str(error)}")
+            else:
+                self.update_status(f"Saved {os.path.basename(path)} but could not index it: "
+                                   f"{str(error)}")
+        if pending:
+            self.root.after(200, self.check_capture_writer)
+        else:
+            self.capture_poll_pending = False
+
     def toggle_window_focus(self, event=None):
         """Toggle between utility and target application"""
         if not hasattr(self, 'target_hwnd') or not self.target_hwnd:
@@ -483,26 +614,29 @@ if __name__ == "__main__":
             self.update_status(f"Error toggling window focus: {str(e)}")
 
     def update_mouse_position(self):
-        """Update mouse position display every 100ms"""
+        """Poll the cursor probe; it slows down while the cursor is idle"""
+        delay = 100
         try:
-            x, y = pyautogui.position()
-            color = pyautogui.pixel(x, y)
-            hex_color = '#{:02x}{:02x}{:02x}'.format(color[0], color[1], color[2])
-            
-            self.xy_entry.delete(0, tk.END)
-            self.xy_entry.insert(0, f"{x},{y}")
-            
-            self.rgb_entry.delete(0, tk.END)
-            self.rgb_entry.insert(0, f"{color[0]},{color[1]},{color[2]}")
-            
-            self.hex_entry.delete(0, tk.END)
-            self.hex_entry.insert(0, hex_color)
-            
-            self.color_preview.configure(bg=hex_color)
+            delay = self.cursor_probe.tick()
         except:
             pass
         finally:
-            self.root.after(100, self.update_mouse_position)
+            self.root.after(delay, self.update_mouse_position)
+    
+    def show_cursor_position(self, x, y):
+        self.xy_entry.delete(0, tk.END)
+        self.xy_entry.insert(0, f"{x},{y}")
+    
+    def show_cursor_color(self, color):
+        hex_color = '#{:02x}{:02x}{:02x}'.format(color[0], color[1], color[2])
+        
+        self.rgb_entry.delete(0, tk.END)
+        self.rgb_entry.insert(0, f"{color[0]},{color[1]},{color[2]}")
+        
+        self.hex_entry.delete(0, tk.END)
+        self.hex_entry.insert(0, hex_color)
+        
+        self.color_preview.configure(bg=hex_color)
         
     def update_status(self, message, clear=False):
         self.status_text.configure(state='normal')
@@ -513,31 +647,30 @@ if __name__ == "__main__":
         self.status_text.configure(state='disabled')
         
     def show_captured_images(self):
-        images = []
-        for filename in os.listdir(self.save_dir):
-            if filename.endswith('.png'):
-                element_name = filename[:-4]
-                img = cv2.imread(f'{self.save_dir}/{filename}')
-                if img is not None:
-                    height, width = img.shape[:2]
-                    images.append(f"{element_name}: {width}x{height} pixels")
+        """List captures matching the search box, served from the index"""
+        self.reference_index.refresh()
+        references = self.reference_index.search(self.search_entry.get().strip())
+        images = [f"{os.path.splitext(ref.name)[0]}: {ref.width}x{ref.height} pixels"
+                  for ref in references]
         
         if images:
             self.update_status("\nCaptured Reference Images:\n" + "\n".join(images))
+            thumbnail = self.reference_index.thumbnail(references[0].name)
+            if thumbnail is not None:
+                self.update_preview(Image.fromarray(cv2.cvtColor(thumbnail, cv2.COLOR_BGR2RGB)))
         else:
             self.update_status("\nNo reference images found")
+            self.update_preview()
         
     def run(self):
         self.root.mainloop()
 
     def save_recording(self):
-        if hasattr(self, 'current_recording') and self.current_recording is not None:
-            try:
-                save_path = self.recording_path.get()
-                self.current_recording.write(save_path)
-                self.update_status(f"Recording saved to: {save_path}")
-            except Exception as e:
-                self.update_status(f"Error saving recording: {str(e)}")
+        """Frames are written while recording, so saving just finishes the file"""
+        if self.recording:
+            self.stop_recording()
+        elif self.video_recorder is not None:
+            self.update_status(f"Recording saved to: {self.video_recorder.path}")
         else:
             self.update_status("No recording available to save")
 
@@ -545,23 +678,38 @@ if __name__ == "__main__":
         """Start screen recording"""
         try:
             x, y = pyautogui.position()
-            region = (x-50, y-50, 100, 100)  # Record 100x100 area around mouse
-            self.current_recording = cv2.VideoWriter(
-                self.recording_path.get(),
-                cv2.VideoWriter_fourcc(*'mp4v'),
-                30.0, (100, 100)
-            )
+            region = (x-50, y-50, x+50, y+50)  # Record 100x100 area around mouse
+            save_path = self.recording_path.get()
+            os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+            self.video_recorder = VideoRecorder(self.screen, save_path, region, fps=30.0)
+            self.video_recorder.start()
             self.recording = True
+            self.record_button.configure(text="Stop Video (F9)", bg='#FF4444')
             self.update_status("Recording started...")
+            self.root.after(1000, self.poll_recording)
         except Exception as e:
             self.update_status(f"Error starting recording: {str(e)}")
 
+    def poll_recording(self):
+        """Show recorder progress and stop if capture or encoding failed"""
+        if not self.recording:
+            return
+        if not self.video_recorder.recording:
+            self.stop_recording()
+            return
+        self.update_status(f"Recording: {self.video_recorder.summary()}")
+        self.root.after(1000, self.poll_recording)
+
     def stop_recording(self):
         """Stop screen recording"""
-        if hasattr(self, 'current_recording') and self.current_recording is not None:
-            self.current_recording.release()
+        if self.video_recorder is not None and self.recording:
+            stats = self.video_recorder.stop()
             self.recording = False
-            self.update_status("Recording stopped")
+            self.record_button.configure(text="Record Video (F9)", bg=self.colors['button'])
+            if stats['error']:
+                self.update_status(f"Recording stopped: {stats['error']}")
+            self.update_status(f"Recording saved to: {self.video_recorder.path} - "
+                               f"{self.video_recorder.summary()}")
 
     def toggle_recording(self, event=None):
         """Toggle screen recording on/off"""
@@ -592,6 +740,14 @@ if __name__ == "__main__":
                 if not os.path.exists(directory):
                     os.makedirs(directory)
             
+            # Finish queued captures before their folder changes
+            self.capture_writer.close()
+            self.reference_index.close()
+            self.reference_index = ReferenceIndex(self.save_dir)
+            self.deduplicator = ReferenceDeduplicator(self.reference_index)
+            self.deduplicator.prewarm()
+            self.capture_writer = self.create_capture_writer()
+            
             # Update paths in entry fields
             self.log_path.delete(0, tk.END)
             self.log_path.insert(0, os.path.join(self.log_dir, "capture_log.txt"))
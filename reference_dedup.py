@@ -0,0 +1,309 @@
+"""Find and fold together near-duplicate reference images.
+
+    python reference_dedup.py ref_images macro_config.json examples/*.json
+    python reference_dedup.py ref_images macro.jsonl --distance 6 --dry-run
+
+Captures are compared by the 64-bit perceptual hash kept in the folder's
+ReferenceIndex; candidates within ``distance`` bits are found through a
+BK-tree, so each lookup only visits a small part of the library. The hash
+is grayscale and maps every flat image to the same value, so candidates
+are only taken as duplicates once their pixels match as well. The batch
+mode keeps the oldest capture of each group, moves the others into a
+``duplicates`` subfolder and points every Image reference in the given
+macro files at the survivor.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import cv2
+
+from macro_stream import MacroStream
+from reference_index import ReferenceIndex, ReferenceInfo, hamming, perceptual_hash
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance.
+
+    The triangle inequality means a query only descends into children whose
+    edge distance is within ``max_distance`` of its distance to the node.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        node = [value, [item], {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            if distance == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        """Return (distance, item) pairs within max_distance, closest first"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.extend((distance, item) for item in items)
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def __len__(self):
+        return self.size
+
+
+class ReferenceDeduplicator:
+    """Looks up near-duplicates of new captures in a reference folder.
+
+    Two images count as duplicates when they have the same size, their
+    perceptual hashes differ in at most ``max_distance`` bits and no channel
+    of any pixel differs by more than ``pixel_tolerance``. ``find`` and
+    ``add`` may be called from different threads, e.g. the UI thread and a
+    capture writer's workers; ``reserve`` lets a capture that is still being
+    written match the ones after it. The hash tree is built on first use, or in
+    the background once ``prewarm`` is called, since refreshing the index
+    decodes every capture it has not seen yet. While that background build
+    runs, ``find`` only checks reserved captures instead of waiting.
+    """
+
+    def __init__(self, index, max_distance=4, pixel_tolerance=16):
+        self.index = index
+        self.max_distance = max_distance
+        self.pixel_tolerance = pixel_tolerance
+        self.tree = None
+        self._pending = {}
+        self._building = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def prewarm(self):
+        """Build the hash tree on a background thread"""
+        with self._lock:
+            self._building = True
+        threading.Thread(target=self._prewarm, daemon=True).start()
+
+    def rebuild(self):
+        """Rescan the folder and reload the hash tree from the index"""
+        self.index.refresh()
+        tree = BKTree()
+        for ref in self.index.list(order='name'):
+            tree.add(ref.phash, ref)
+        with self._lock:
+            self.tree = tree
+
+    def find(self, image):
+        """Return the ReferenceInfo the image duplicates, or None"""
+        height, width = image.shape[:2]
+        phash = perceptual_hash(image)
+        with self._lock:
+            tree, building = self.tree, self._building
+            candidates = [(ref, pixels) for ref, pixels in self._pending.values()
+                          if (ref.width, ref.height) == (width, height) and
+                          hamming(ref.phash, phash) <= self.max_distance]
+        if tree is None and not building:
+            tree = self._ensure_tree()
+        if tree is not None:
+            with self._lock:
+                candidates += [(ref, None) for _, ref in tree.search(phash, self.max_distance)
+                               if (ref.width, ref.height) == (width, height) and
+                               ref.name not in self._pending]
+        for ref, pixels in candidates:
+            if pixels is None:
+                pixels = self._read(ref)
+            if pixels is not None and self.same_pixels(image, pixels):
+                return ref
+        return None
+
+    def same_pixels(self, first, second):
+        """True when two images differ by at most pixel_tolerance anywhere"""
+        return (first.shape == second.shape and
+                int(cv2.absdiff(first, second).max()) <= self.pixel_tolerance)
+
+    def reserve(self, path, image):
+        """Record a capture when it is queued, before its file exists"""
+        height, width = image.shape[:2]
+        ref = ReferenceInfo(os.path.basename(path), width, height, None, None,
+                            perceptual_hash(image), time.time(), None)
+        with self._lock:
+            self._pending[ref.name] = (ref, image)
+
+    def discard(self, path):
+        """Forget a reserved capture whose write failed"""
+        with self._lock:
+            self._pending.pop(os.path.basename(path), None)
+
+    def add(self, path, image, reserved=None):
+        """Record a capture that was kept so later captures can match it.
+
+        ``reserved`` is the path it was reserved under, if that differs.
+        """
+        # Wait for a build in progress, which may have listed the index
+        # before this capture was in it
+        tree = self._ensure_tree()
+        if self.index.add(path, image):
+            ref = self.index.get(path)
+            with self._lock:
+                self._pending.pop(os.path.basename(reserved or path), None)
+                tree.add(ref.phash, ref)
+
+    def groups(self):
+        """{survivor name: [duplicate names]}, keeping the oldest capture"""
+        tree = self._ensure_tree()
+        assigned = set()
+        groups = {}
+        for ref in sorted(self.index.list(), key=lambda r: (r.captured, r.name)):
+            if ref.name in assigned:
+                continue
+            assigned.add(ref.name)
+            candidates = [other for _, other in tree.search(ref.phash, self.max_distance)
+                          if other.name not in assigned and
+                          (other.width, other.height) == (ref.width, ref.height)]
+            if not candidates:
+                continue
+            pixels = self._read(ref)
+            if pixels is None:
+                continue
+            duplicates = []
+            for other in candidates:
+                other_pixels = self._read(other)
+                if other_pixels is not None and self.same_pixels(pixels, other_pixels):
+                    duplicates.append(other.name)
+            assigned.update(duplicates)
+            if duplicates:
+                groups[ref.name] = sorted(duplicates)
+        return groups
+
+    def compact(self, macro_paths=(), dry_run=False):
+        """Move duplicates aside and repoint macro references at survivors.
+
+        Returns (groups, {macro path: references rewritten}).
+        """
+        groups = self.groups()
+        survivors = {}
+        for survivor, duplicates in groups.items():
+            for name in duplicates:
+                survivors[os.path.join(self.index.directory, name)] = survivor
+        rewritten = {path: rewrite_macro(path, survivors, dry_run) for path in macro_paths}
+
+        if not dry_run and survivors:
+            target = os.path.join(self.index.directory, 'duplicates')
+            os.makedirs(target, exist_ok=True)
+            for path in survivors:
+                shutil.move(path, os.path.join(target, os.path.basename(path)))
+            self.rebuild()
+        return groups, rewritten
+
+    def _ensure_tree(self):
+        if self.tree is None:
+            with self._build_lock:
+                if self.tree is None:
+                    self.rebuild()
+        return self.tree
+
+    def _prewarm(self):
+        try:
+            self._ensure_tree()
+        except Exception:
+            # The index was closed meanwhile; the next lookup builds the tree
+            pass
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _read(self, ref):
+        # None once the file is gone, e.g. moved aside by compact
+        return cv2.imread(os.path.join(self.index.directory, ref.name), cv2.IMREAD_UNCHANGED)
+
+
+def _rewrite_step(step, survivors, base_dir):
+    reference = (step.get("params") or {}).get("reference")
+    if not isinstance(reference, dict) or reference.get("type") != "Image":
+        return False
+    path = reference.get("path")
+    if not path:
+        return False
+    for candidate in (os.path.abspath(path), os.path.abspath(os.path.join(base_dir, path))):
+        survivor = survivors.get(candidate)
+        if survivor is not None:
+            reference["path"] = os.path.join(os.path.dirname(path), survivor)
+            return True
+    return False
+
+
+def rewrite_macro(path, survivors, dry_run=False):
+    """Point a .json or .jsonl macro's image references at the survivors.
+
+    ``survivors`` maps absolute duplicate paths to the surviving file name.
+    Relative reference paths are tried against the working directory and
+    the macro's own folder, and keep their directory when rewritten.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    changed = 0
+    if path.endswith('.jsonl'):
+        with MacroStream(path) as stream:
+            edits = [(i, step) for i, step in enumerate(stream)
+                     if _rewrite_step(step, survivors, base_dir)]
+            if not dry_run:
+                stream.replace_many(edits)
+        return len(edits)
+
+    with open(path, 'r') as f:
+        steps = json.load(f)
+    for step in steps:
+        if _rewrite_step(step, survivors, base_dir):
+            changed += 1
+    if changed and not dry_run:
+        with open(path, 'w') as f:
+            json.dump(steps, f, indent=4)
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact near-duplicate reference images")
+    parser.add_argument('directory', help="reference image folder")
+    parser.add_argument('macros', nargs='*', help="macro files whose references to rewrite")
+    parser.add_argument('--distance', type=int, default=4,
+                        help="maximum perceptual hash distance in bits")
+    parser.add_argument('--pixel-tolerance', type=int, default=16,
+                        help="largest per-channel pixel difference between duplicates")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="report what would change without touching files")
+    args = parser.parse_args(argv)
+
+    index = ReferenceIndex(args.directory)
+    groups, rewritten = ReferenceDeduplicator(
+        index, args.distance, args.pixel_tolerance).compact(args.macros, args.dry_run)
+    for survivor, duplicates in sorted(groups.items()):
+        print(f"{survivor}: {', '.join(duplicates)}")
+    moved = sum(len(d) for d in groups.values())
+    print(f"{moved} duplicates in {len(groups)} groups, "
+          f"{sum(rewritten.values())} macro references rewritten"
+          + (" (dry run)" if args.dry_run else ""))
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
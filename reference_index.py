@@ -0,0 +1,200 @@
+import collections
+import hashlib
+import os
+import sqlite3
+import threading
+
+import cv2
+import numpy as np
+
+INDEX_NAME = '.reference_index.sqlite'
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.jpg', '.jpeg')
+
+ReferenceInfo = collections.namedtuple(
+    'ReferenceInfo', 'name width height bytes sha1 phash captured mtime')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    name TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    phash INTEGER NOT NULL,
+    captured REAL NOT NULL,
+    thumbnail BLOB
+);
+CREATE INDEX IF NOT EXISTS refs_phash ON refs (phash);
+CREATE INDEX IF NOT EXISTS refs_sha1 ON refs (sha1);
+"""
+
+_COLUMNS = 'name, width, height, bytes, sha1, phash, captured, mtime'
+
+
+def perceptual_hash(image):
+    """64-bit DCT hash of a BGR or grayscale image.
+
+    Low-frequency DCT coefficients are compared against their median, so
+    re-encoded or slightly shifted captures of the same element land a few
+    bits apart while unrelated images differ in about half of them.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class ReferenceIndex:
+    """Metadata index for a folder of reference images, kept in SQLite.
+
+    Each image's size, content hash, perceptual hash, capture time and a
+    small PNG thumbnail are stored in ``INDEX_NAME`` inside the folder.
+    ``refresh`` only decodes files whose mtime or size changed since the
+    last scan, so listing, searching and previewing a library of thousands
+    of captures never touches the images themselves.
+    """
+
+    def __init__(self, directory, thumbnail_size=64):
+        self.directory = os.path.abspath(directory)
+        self.thumbnail_size = thumbnail_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.directory, INDEX_NAME),
+                                   check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def refresh(self):
+        """Bring the index in line with the folder and return what changed"""
+        with self._lock:
+            known = {name: (mtime, size) for name, mtime, size in
+                     self._db.execute('SELECT name, mtime, bytes FROM refs')}
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'failed': 0}
+        seen = set()
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            seen.add(entry.name)
+            stat = entry.stat()
+            if known.get(entry.name) == (stat.st_mtime_ns, stat.st_size):
+                counts['unchanged'] += 1
+                continue
+            if self._index_file(entry.name, stat):
+                counts['updated' if entry.name in known else 'added'] += 1
+            else:
+                counts['failed'] += 1
+
+        gone = [(name,) for name in known if name not in seen]
+        if gone:
+            with self._lock, self._db:
+                self._db.executemany('DELETE FROM refs WHERE name = ?', gone)
+        counts['removed'] = len(gone)
+        return counts
+
+    def add(self, path, image=None):
+        """Index one file right after it was written, reusing its pixels"""
+        name = os.path.basename(path)
+        return self._index_file(name, os.stat(os.path.join(self.directory, name)), image)
+
+    def remove(self, name):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM refs WHERE name = ?', (os.path.basename(name),))
+
+    def get(self, name):
+        """Return the ReferenceInfo for a file name, or None"""
+        with self._lock:
+            row = self._db.execute(f'SELECT {_COLUMNS} FROM refs WHERE name = ?',
+                                   (os.path.basename(name),)).fetchone()
+        return self._info(row) if row else None
+
+    def list(self, order='captured'):
+        """Every indexed reference, newest capture first by default"""
+        if order not in ('captured', 'name'):
+            raise Exception(f"Unknown sort order: {order}")
+        direction = 'DESC' if order == 'captured' else 'ASC'
+        return self._query(f'ORDER BY {order} {direction}')
+
+    def search(self, text=None, min_size=None, max_size=None, sha1=None):
+        """Filter by name substring, (width, height) bounds or content hash"""
+        clauses, args = [], []
+        if text:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            args.append(f'%{escaped}%')
+        if min_size:
+            clauses.append('width >= ? AND height >= ?')
+            args.extend(min_size)
+        if max_size:
+            clauses.append('width <= ? AND height <= ?')
+            args.extend(max_size)
+        if sha1:
+            clauses.append('sha1 = ?')
+            args.append(sha1)
+        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self._query(f'{where} ORDER BY captured DESC', args)
+
+    def thumbnail(self, name):
+        """Decoded BGR thumbnail for a file name, or None"""
+        with self._lock:
+            row = self._db.execute('SELECT thumbnail FROM refs WHERE name = ?',
+                                   (os.path.basename(name),)).fetchone()
+        if not row or row[0] is None:
+            return None
+        return cv2.imdecode(np.frombuffer(row[0], np.uint8), cv2.IMREAD_COLOR)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM refs').fetchone()[0]
+
+    def _query(self, tail, args=()):
+        with self._lock:
+            rows = self._db.execute(f'SELECT {_COLUMNS} FROM refs {tail}', args).fetchall()
+        return [self._info(row) for row in rows]
+
+    def _info(self, row):
+        info = ReferenceInfo(*row)
+        return info._replace(phash=_to_unsigned(info.phash))
+
+    def _index_file(self, name, stat, image=None):
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        if image is None:
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return False
+
+        height, width = image.shape[:2]
+        scale = min(1.0, self.thumbnail_size / max(width, height))
+        thumb = image
+        if scale < 1.0:
+            thumb = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.png', thumb)
+        row = (name, stat.st_mtime_ns, stat.st_size, width, height,
+               hashlib.sha1(data).hexdigest(), _to_signed(perceptual_hash(image)),
+               stat.st_mtime, encoded.tobytes() if ok else None)
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+        return True
@@ -0,0 +1,106 @@
+import collections
+import os
+import threading
+
+import cv2
+
+
+class ReferenceTemplate:
+    """A decoded reference image, kept in both color and grayscale form"""
+    __slots__ = ('path', 'mtime', 'color', 'gray', 'nbytes')
+
+    def __init__(self, path, mtime, color):
+        self.path = path
+        self.mtime = mtime
+        self.color = color
+        self.gray = cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)
+        self.nbytes = self.color.nbytes + self.gray.nbytes
+
+    @property
+    def size(self):
+        """(width, height) of the reference in pixels"""
+        return self.color.shape[1], self.color.shape[0]
+
+
+class ReferenceStore:
+    """In-memory cache of decoded reference images.
+
+    Entries are keyed by absolute path and invalidated when the file's mtime
+    changes. Once the decoded pixels exceed ``max_bytes`` the least recently
+    used entries are evicted. Other decoded references, such as video
+    keyframes, share the same budget by passing their own ``loader``.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, loader=None):
+        """Return the ReferenceTemplate for path, decoding it only if needed.
+
+        ``loader(path, mtime)`` builds the entry for non-image references; it
+        must return an object with ``mtime`` and ``nbytes`` attributes.
+        """
+        key = os.path.abspath(path)
+        mtime = os.stat(key).st_mtime_ns
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = (loader or _load_image)(key, mtime)
+
+        with self._lock:
+            self._discard(key)
+            # A single image bigger than the whole budget is served uncached
+            if entry.nbytes <= self.max_bytes:
+                self._entries[key] = entry
+                self.current_bytes += entry.nbytes
+                while self.current_bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted.nbytes
+                    self.evictions += 1
+        return entry
+
+    def invalidate(self, path):
+        """Drop a single reference from the cache"""
+        with self._lock:
+            self._discard(os.path.abspath(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Counters for confirming the cache is doing its job"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.nbytes
+
+
+def _load_image(path, mtime):
+    color = cv2.imread(path, cv2.IMREAD_COLOR)
+    if color is None:
+        raise Exception(f"Could not decode reference image: {path}")
+    return ReferenceTemplate(path, mtime, color)
@@ -10,6 +10,7 @@ def install_requirements():
         'pywin32',
         'selenium',
         'webdriver_manager',
+        'pyperclip',
         'numpy',
         'tkinter',
         'json',
@@ -0,0 +1,260 @@
+import glob
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import ImageGrab
+
+
+class ScreenSource:
+    """Base class for everything that hands out screen pixels.
+
+    Frames are BGR uint8 arrays, the same layout OpenCV and the matchers
+    use. A full frame is cached for ``max_age`` seconds and shared by every
+    consumer that asks within that window, so the cursor panel, captures and
+    playback stop taking their own screenshots. Subclasses implement
+    ``_grab_frame(bbox)``, where bbox is (left, top, right, bottom) or None
+    for the whole screen.
+    """
+
+    def __init__(self, max_age=0.05):
+        self.max_age = max_age
+        self.grabs = 0
+        self.shared = 0
+        self._frame = None
+        self._frame_time = 0.0
+        self._lock = threading.Lock()
+
+    def grab(self, bbox=None):
+        """Return the screen, or the (left, top, right, bottom) part of it"""
+        frame = self._fresh_frame()
+        if frame is None:
+            if bbox is not None and self.max_age <= 0:
+                # Nothing is shared, so go straight to a region read
+                return self._grab_region(bbox)
+            frame = self.frame()
+        if bbox is None:
+            return frame
+        return _crop(frame, bbox)
+
+    def frame(self):
+        """Return a full frame, reusing the shared one while it is fresh"""
+        frame = self._fresh_frame()
+        if frame is not None:
+            return frame
+        with self._lock:
+            self._frame = self._grab_frame(None)
+            self._frame_time = time.monotonic()
+            self.grabs += 1
+            return self._frame
+
+    def pixel(self, x, y):
+        """Return the (r, g, b) color at a screen coordinate"""
+        frame = self._fresh_frame()
+        if frame is not None:
+            b, g, r = frame[y, x][:3]
+            return int(r), int(g), int(b)
+        with self._lock:
+            self.grabs += 1
+        return self._grab_pixel(x, y)
+
+    def grab_region(self, bbox):
+        """Fetch new pixels for just bbox, bypassing the shared frame"""
+        return self._grab_region(bbox)
+
+    def invalidate(self):
+        """Force the next consumer to take a new frame"""
+        with self._lock:
+            self._frame = None
+
+    def stats(self):
+        return {'grabs': self.grabs, 'shared': self.shared}
+
+    def _fresh_frame(self):
+        with self._lock:
+            if self._frame is not None and time.monotonic() - self._frame_time <= self.max_age:
+                self.shared += 1
+                return self._frame
+        return None
+
+    def _grab_region(self, bbox):
+        with self._lock:
+            self.grabs += 1
+        return self._grab_frame(bbox)
+
+    def _grab_frame(self, bbox):
+        raise NotImplementedError
+
+    def _grab_pixel(self, x, y):
+        b, g, r = self._grab_frame((x, y, x + 1, y + 1))[0, 0][:3]
+        return int(r), int(g), int(b)
+
+
+class DesktopScreenSource(ScreenSource):
+    """Grabs the real desktop through Pillow's ImageGrab.
+
+    ImageGrab always captures the whole screen and crops afterwards, so on
+    Windows regions are copied with a BitBlt of just the bbox instead, and
+    single pixels are read with GetPixel.
+    """
+
+    def _grab_frame(self, bbox):
+        if bbox is not None and sys.platform == 'win32':
+            return _win32_region(bbox)
+        image = ImageGrab.grab(bbox=bbox)
+        return cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    def _grab_pixel(self, x, y):
+        if sys.platform != 'win32':
+            return super()._grab_pixel(x, y)
+        import win32gui
+        hdc = win32gui.GetDC(0)
+        try:
+            color = win32gui.GetPixel(hdc, x, y)
+        finally:
+            win32gui.ReleaseDC(0, hdc)
+        return color & 0xff, (color >> 8) & 0xff, (color >> 16) & 0xff
+
+
+class X11ScreenSource(ScreenSource):
+    """Grabs an X11 display directly, e.g. an Xvfb server like ":99".
+
+    Full frames go through ImageGrab; regions and single pixels are read
+    with XGetImage of just that rectangle when python-xlib is installed.
+    """
+
+    def __init__(self, display=None, max_age=0.05):
+        super().__init__(max_age)
+        self.display = display or os.environ.get('DISPLAY', ':0')
+        self._xdisplay = None
+        self._xlock = threading.Lock()
+
+    def _grab_frame(self, bbox):
+        if bbox is not None:
+            frame = self._xget_image(bbox)
+            if frame is not None:
+                return frame
+        image = ImageGrab.grab(bbox=bbox, xdisplay=self.display)
+        return cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    def _xget_image(self, bbox):
+        """BGR pixels of bbox via XGetImage, or None without python-xlib"""
+        if self._xdisplay is None:
+            try:
+                from Xlib import display as xdisplay
+            except ImportError:
+                self._xdisplay = False
+                return None
+            self._xdisplay = xdisplay.Display(self.display)
+        if self._xdisplay is False:
+            return None
+        from Xlib import X
+        screen = self._xdisplay.screen()
+        if screen.root_depth not in (24, 32):
+            return None
+        left, top = max(0, bbox[0]), max(0, bbox[1])
+        right = min(screen.width_in_pixels, bbox[2])
+        bottom = min(screen.height_in_pixels, bbox[3])
+        if right <= left or bottom <= top:
+            return np.zeros((0, 0, 3), np.uint8)
+        with self._xlock:
+            image = screen.root.get_image(left, top, right - left, bottom - top,
+                                          X.ZPixmap, 0xffffffff)
+        pixels = np.frombuffer(image.data, np.uint8)
+        return pixels.reshape(bottom - top, right - left, 4)[:, :, :3].copy()
+
+
+class ReplayScreenSource(ScreenSource):
+    """Serves frames from PNG files so matching can run without a desktop.
+
+    ``frames`` is a directory (its PNGs are replayed in name order) or a
+    list of paths. Every full-screen grab after the first advances to the
+    next file, while region grabs read from the current one. With ``loop``
+    the sequence starts over at the end, otherwise the last frame repeats.
+    """
+
+    def __init__(self, frames, max_age=0.05, loop=True):
+        super().__init__(max_age)
+        if isinstance(frames, str):
+            frames = sorted(glob.glob(os.path.join(frames, '*.png')))
+        if not frames:
+            raise Exception("Replay screen source needs at least one frame")
+        self.paths = list(frames)
+        self.loop = loop
+        self.position = 0
+        self._served = False
+        self._decoded = {}
+
+    def _grab_frame(self, bbox):
+        if bbox is None:
+            if self._served:
+                if self.position + 1 < len(self.paths):
+                    self.position += 1
+                elif self.loop:
+                    self.position = 0
+            self._served = True
+        path = self.paths[self.position]
+
+        frame = self._decoded.get(path)
+        if frame is None:
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is None:
+                raise Exception(f"Could not read replay frame: {path}")
+            self._decoded[path] = frame
+        if bbox is None:
+            return frame
+        return _crop(frame, bbox)
+
+
+def create_screen_source(kind=None, max_age=0.05):
+    """Build a screen source from a name or the MACROFLOW_SCREEN variable.
+
+    Accepted values are "desktop", "x11", "x11:<display>" and
+    "replay:<directory>". Without either, Linux sessions with a DISPLAY use
+    the X11 grabber and everything else grabs the desktop.
+    """
+    kind = kind or os.environ.get('MACROFLOW_SCREEN', '')
+    name, _, argument = kind.partition(':')
+    if name == 'replay':
+        return ReplayScreenSource(argument, max_age=max_age)
+    if name == 'x11':
+        return X11ScreenSource(':' + argument if argument else None, max_age=max_age)
+    if name == 'desktop':
+        return DesktopScreenSource(max_age=max_age)
+    if sys.platform.startswith('linux') and os.environ.get('DISPLAY'):
+        return X11ScreenSource(max_age=max_age)
+    return DesktopScreenSource(max_age=max_age)
+
+
+def _win32_region(bbox):
+    """Copy just bbox off the Windows desktop with BitBlt"""
+    import win32con
+    import win32gui
+    import win32ui
+    left, top, right, bottom = bbox
+    width, height = right - left, bottom - top
+    hwnd = win32gui.GetDesktopWindow()
+    window_dc = win32gui.GetWindowDC(hwnd)
+    source = win32ui.CreateDCFromHandle(window_dc)
+    target = source.CreateCompatibleDC()
+    bitmap = win32ui.CreateBitmap()
+    try:
+        bitmap.CreateCompatibleBitmap(source, width, height)
+        target.SelectObject(bitmap)
+        target.BitBlt((0, 0), (width, height), source, (left, top), win32con.SRCCOPY)
+        pixels = np.frombuffer(bitmap.GetBitmapBits(True), np.uint8)
+        return pixels.reshape(height, width, 4)[:, :, :3].copy()
+    finally:
+        win32gui.DeleteObject(bitmap.GetHandle())
+        target.DeleteDC()
+        source.DeleteDC()
+        win32gui.ReleaseDC(hwnd, window_dc)
+
+
+def _crop(frame, bbox):
+    left, top, right, bottom = bbox
+    height, width = frame.shape[:2]
+    return frame[max(0, top):min(height, bottom), max(0, left):min(width, right)]
@@ -0,0 +1,177 @@
+import array
+import collections.abc
+import copy
+import json
+import math
+import re
+
+# Parameters kept in typed columns instead of per-step dicts
+INT_COLUMNS = ('x', 'y')
+FLOAT_COLUMNS = ('seconds', 'confidence')
+MISSING_INT = -2 ** 31
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class StepStore(collections.abc.MutableSequence):
+    """Compact storage for macro steps.
+
+    Action names are interned to small integer codes, coordinates, times and
+    confidences live in typed arrays, and everything else in a step's params
+    is interned in a shared pool, so thousands of identical steps share one
+    params entry. Indexing returns a fresh ``{"action": ..., "params": ...}``
+    dict, so existing code that reads steps as dicts keeps working; changing
+    that dict does not write back, assign the step instead.
+    """
+
+    def __init__(self, steps=()):
+        self.action_names = []
+        self._action_codes = {}
+        self.layouts = []
+        self._layout_ids = {}
+        self.actions = array.array('H')
+        self.layout_refs = array.array('I')
+        self.ints = {name: array.array('i') for name in INT_COLUMNS}
+        self.floats = {name: array.array('d') for name in FLOAT_COLUMNS}
+        self.extend(steps)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        params = {}
+        for key, value, column in self.layouts[self.layout_refs[index]]:
+            if column is None:
+                params[key] = copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+            elif key in self.ints:
+                params[key] = self.ints[key][index]
+            else:
+                params[key] = self.floats[key][index]
+        return {"action": self.action_names[self.actions[index]], "params": params}
+
+    def __setitem__(self, index, step):
+        if index < 0:
+            index += len(self)
+        code, layout, ints, floats = self._encode(step)
+        self.actions[index] = code
+        self.layout_refs[index] = layout
+        for name in INT_COLUMNS:
+            self.ints[name][index] = ints[name]
+        for name in FLOAT_COLUMNS:
+            self.floats[name][index] = floats[name]
+
+    def __delitem__(self, index):
+        if index < 0:
+            index += len(self)
+        del self.actions[index]
+        del self.layout_refs[index]
+        for column in list(self.ints.values()) + list(self.floats.values()):
+            del column[index]
+
+    def insert(self, index, step):
+        code, layout, ints, floats = self._encode(step)
+        self.actions.insert(index, code)
+        self.layout_refs.insert(index, layout)
+        for name in INT_COLUMNS:
+            self.ints[name].insert(index, ints[name])
+        for name in FLOAT_COLUMNS:
+            self.floats[name].insert(index, floats[name])
+
+    def append(self, step):
+        code, layout, ints, floats = self._encode(step)
+        self.actions.append(code)
+        self.layout_refs.append(layout)
+        for name in INT_COLUMNS:
+            self.ints[name].append(ints[name])
+        for name in FLOAT_COLUMNS:
+            self.floats[name].append(floats[name])
+
+    def swap(self, first, second):
+        """Exchange two steps in place without decoding them"""
+        for column in ([self.actions, self.layout_refs] +
+                       list(self.ints.values()) + list(self.floats.values())):
+            column[first], column[second] = column[second], column[first]
+
+    def action_at(self, index):
+        """Action name of a step without building its params"""
+        return self.action_names[self.actions[index]]
+
+    def to_list(self):
+        """Plain list of step dicts, e.g. for json.dump"""
+        return [self[i] for i in range(len(self))]
+
+    def nbytes(self):
+        """Approximate size of the column arrays"""
+        columns = [self.actions, self.layout_refs] + list(self.ints.values()) + list(self.floats.values())
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def _encode(self, step):
+        name = step["action"]
+        code = self._action_codes.get(name)
+        if code is None:
+            code = self._action_codes[name] = len(self.action_names)
+            self.action_names.append(name)
+
+        ints = dict.fromkeys(INT_COLUMNS, MISSING_INT)
+        floats = dict.fromkeys(FLOAT_COLUMNS, math.nan)
+        layout = []
+        for key, value in (step.get("params") or {}).items():
+            # Only exact types go to columns so saving stays lossless
+            if key in ints and type(value) is int and -2 ** 31 < value < 2 ** 31:
+                ints[key] = value
+                layout.append((key, None, key))
+            elif key in floats and type(value) is float and not math.isnan(value):
+                floats[key] = value
+                layout.append((key, None, key))
+            else:
+                layout.append((key, value, None))
+
+        # Tuples of scalars hash directly; the value's type is part of the key
+        # so 1, 1.0 and True stay distinct. Nested values fall back to JSON.
+        try:
+            layout_key = tuple((key, type(value), value, column)
+                               for key, value, column in layout)
+            layout_id = self._layout_ids.get(layout_key)
+        except TypeError:
+            layout_key = json.dumps(layout, sort_keys=True)
+            layout_id = self._layout_ids.get(layout_key)
+        if layout_id is None:
+            layout_id = self._layout_ids[layout_key] = len(self.layouts)
+            self.layouts.append(tuple(layout))
+        return code, layout_id, ints, floats
+
+
+def load_step_store(f):
+    """Read a JSON list of steps from a file into a StepStore.
+
+    Steps are decoded one at a time and go straight into the columns, so
+    the whole list of step dicts never exists at once.
+    """
+    return StepStore(_iter_steps(f.read()))
+
+
+def _iter_steps(text):
+    position = _WHITESPACE.match(text).end()
+    if text[position:position + 1] != '[':
+        raise Exception("Macro file must hold a JSON list of steps")
+    position = _WHITESPACE.match(text, position + 1).end()
+    if text[position:position + 1] == ']':
+        position = _WHITESPACE.match(text, position + 1).end()
+    else:
+        while True:
+            step, position = _DECODER.raw_decode(text, position)
+            yield step
+            position = _WHITESPACE.match(text, position).end()
+            separator = text[position:position + 1]
+            if separator not in (',', ']'):
+                raise Exception(f"Expected ',' or ']' at character {position} of the macro file")
+            position = _WHITESPACE.match(text, position + 1).end()
+            if separator == ']':
+                break
+    if position != len(text):
+        raise Exception(f"Unexpected data after the step list at character {position}")
@@ -0,0 +1,165 @@
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+
+class StepListView:
+    """Listbox that only renders the rows currently on screen.
+
+    The underlying Listbox never holds more than one screenful of rows, no
+    matter how many steps the macro has; scrolling and edits re-render just
+    that window. It keeps the Listbox calls the editor already uses
+    (curselection, selection_set, selection_clear, see) but with absolute
+    step indices, and adds inserted/deleted/swapped/reset notifications
+    that the editor calls after changing the step list.
+    """
+
+    def __init__(self, parent, steps, **listbox_options):
+        self.steps = steps
+        self.top = 0
+        self.selected = None
+        self.listbox = tk.Listbox(parent, exportselection=False, **listbox_options)
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.line_height = tkfont.Font(font=self.listbox['font']).metrics('linespace') + 1
+
+        self.listbox.bind('<Configure>', lambda e: self.render())
+        self.listbox.bind('<<ListboxSelect>>', self._on_select)
+        self.listbox.bind('<MouseWheel>', self._on_wheel)
+        self.listbox.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll(3))
+        self.listbox.bind('<Up>', lambda e: self._move_selection(-1))
+        self.listbox.bind('<Down>', lambda e: self._move_selection(1))
+
+    def pack(self):
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    @property
+    def rows(self):
+        """How many rows fit in the widget right now"""
+        height = self.listbox.winfo_height()
+        if height <= 1:
+            return int(self.listbox['height'])
+        return max(1, height // self.line_height)
+
+    def label(self, index):
+        if hasattr(self.steps, 'action_at'):
+            return f"{index + 1}. {self.steps.action_at(index)}"
+        return f"{index + 1}. {self.steps[index]['action']}"
+
+    def render(self):
+        """Redraw the visible window of rows"""
+        total = len(self.steps)
+        rows = self.rows
+        self.top = max(0, min(self.top, total - rows))
+        bottom = min(total, self.top + rows)
+
+        self.listbox.delete(0, tk.END)
+        for index in range(self.top, bottom):
+            self.listbox.insert(tk.END, self.label(index))
+        if self.selected is not None and self.top <= self.selected < bottom:
+            self.listbox.selection_set(self.selected - self.top)
+
+        if total:
+            self.scrollbar.set(self.top / total, bottom / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _visible(self, index):
+        return self.top <= index < self.top + self.rows
+
+    # Edit notifications - only re-render when the visible rows change
+
+    def reset(self, steps=None):
+        if steps is not None:
+            self.steps = steps
+        self.top = 0
+        self.selected = None
+        self.render()
+
+    def inserted(self, index):
+        if self.selected is not None and self.selected >= index:
+            self.selected += 1
+        if index < self.top + self.rows:
+            self.render()
+        else:
+            self._update_scrollbar()
+
+    def deleted(self, index):
+        if self.selected == index:
+            self.selected = None
+        elif self.selected is not None and self.selected > index:
+            self.selected -= 1
+        if index < self.top + self.rows or self.top + self.rows > len(self.steps):
+            self.render()
+        else:
+            self._update_scrollbar()
+
+    def swapped(self, first, second):
+        if self._visible(first) or self._visible(second):
+            for index in (first, second):
+                if self._visible(index):
+                    row = index - self.top
+                    self.listbox.delete(row)
+                    self.listbox.insert(row, self.label(index))
+            if self.selected is not None and self._visible(self.selected):
+                self.listbox.selection_clear(0, tk.END)
+                self.listbox.selection_set(self.selected - self.top)
+
+    # Listbox-compatible selection API, in absolute step indices
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def selection_set(self, index, last=None):
+        self.selected = index
+        if self._visible(index):
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(index - self.top)
+
+    def selection_clear(self, first=None, last=None):
+        self.selected = None
+        self.listbox.selection_clear(0, tk.END)
+
+    def see(self, index):
+        if not self._visible(index):
+            self.top = max(0, index - self.rows // 2)
+            self.render()
+
+    def scroll(self, rows):
+        self.top = max(0, min(self.top + rows, len(self.steps) - self.rows))
+        self.render()
+
+    def _update_scrollbar(self):
+        total = len(self.steps)
+        if total:
+            self.scrollbar.set(self.top / total, min(total, self.top + self.rows) / total)
+
+    def _on_scrollbar(self, command, value, unit=None):
+        if command == 'moveto':
+            self.top = int(float(value) * len(self.steps))
+            self.render()
+        elif command == 'scroll':
+            step = int(value) * (self.rows if unit == 'pages' else 1)
+            self.scroll(step)
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.top + selection[0]
+
+    def _move_selection(self, delta):
+        if not self.steps:
+            return "break"
+        index = 0 if self.selected is None else self.selected + delta
+        index = max(0, min(index, len(self.steps) - 1))
+        self.selected = index
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+        self.render()
+        return "break"
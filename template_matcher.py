@@ -0,0 +1,253 @@
+import collections
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from reference_store import ReferenceTemplate
+
+# Same shape as the Box returned by pyautogui.locateOnScreen so callers can
+# keep using pyautogui.center() on the result
+Box = collections.namedtuple('Box', 'left top width height')
+
+
+def to_bgr_array(image):
+    """Convert a path, PIL image or numpy array into a BGR uint8 array"""
+    if isinstance(image, ReferenceTemplate):
+        return image.color
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        return image
+    if isinstance(image, str):
+        array = cv2.imread(image, cv2.IMREAD_COLOR)
+        if array is None:
+            raise Exception(f"Could not read image: {image}")
+        return array
+    if isinstance(image, Image.Image):
+        return cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+    raise TypeError(f"Unsupported image type: {type(image).__name__}")
+
+
+def to_gray_array(image):
+    """Convert a path, PIL image or numpy array into a grayscale uint8 array"""
+    if isinstance(image, ReferenceTemplate):
+        return image.gray
+    if isinstance(image, np.ndarray) and image.ndim == 2:
+        return image
+    return cv2.cvtColor(to_bgr_array(image), cv2.COLOR_BGR2GRAY)
+
+
+class PyramidMatcher:
+    """Coarse-to-fine template matcher.
+
+    The haystack and needle are downsampled with an image pyramid, the
+    coarse level is searched with a relaxed threshold, and only the windows
+    around the best coarse candidates are matched again at full resolution.
+    A match is accepted with the same rule pyautogui uses: the normalized
+    correlation coefficient at full resolution must reach ``confidence``.
+    Needles that are too small or too flat to survive downsampling are
+    matched at full resolution only.
+    """
+
+    def __init__(self, max_levels=3, min_template_size=12, coarse_slack=0.2,
+                 max_candidates=5, min_texture=8.0,
+                 min_texture_ratio=0.5):
+        self.max_levels = max_levels
+        self.min_template_size = min_template_size
+        self.coarse_slack = coarse_slack
+        self.max_candidates = max_candidates
+        self.min_texture = min_texture
+        self.min_texture_ratio = min_texture_ratio
+
+    def pyramid_levels(self, needle_shape):
+        """Number of pyrDown steps the needle can take and stay matchable"""
+        height, width = needle_shape[:2]
+        levels = 0
+        while (levels < self.max_levels and
+               min(height, width) >> (levels + 1) >= self.min_template_size):
+            levels += 1
+        return levels
+
+    def locate(self, haystack, needle, confidence=0.9, grayscale=False):
+        """Return the Box of the best match scoring >= confidence, or None"""
+        haystack, needle = self._prepare(haystack, needle, grayscale)
+        if (needle.shape[0] > haystack.shape[0] or
+                needle.shape[1] > haystack.shape[1]):
+            return None
+
+        # Stop descending once the needle loses its structure to the blur,
+        # since the coarse score then says nothing about the full one
+        full_texture = needle.std()
+        coarse_haystack, coarse_needle = haystack, needle
+        levels = 0
+        for _ in range(self.pyramid_levels(needle.shape)):
+            smaller = cv2.pyrDown(coarse_needle)
+            texture = smaller.std()
+            if (texture < self.min_texture or
+                    texture < self.min_texture_ratio * full_texture):
+                break
+            coarse_needle = smaller
+            coarse_haystack = cv2.pyrDown(coarse_haystack)
+            levels += 1
+        if levels == 0:
+            return self._match_full(haystack, needle, confidence)
+
+        candidates = self._coarse_candidates(
+            coarse_haystack, coarse_needle, confidence - self.coarse_slack)
+
+        scale = 1 << levels
+        margin = 2 * scale
+        needle_h, needle_w = needle.shape[:2]
+        best = None
+        for cx, cy in candidates:
+            left = max(0, cx * scale - margin)
+            top = max(0, cy * scale - margin)
+            right = min(haystack.shape[1], cx * scale + needle_w + margin)
+            bottom = min(haystack.shape[0], cy * scale + needle_h + margin)
+            window = haystack[top:bottom, left:right]
+            if window.shape[0] < needle_h or window.shape[1] < needle_w:
+                continue
+            result = cv2.matchTemplate(window, needle, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            if score >= confidence and (best is None or score > best[0]):
+                best = (score, Box(left + x, top + y, needle_w, needle_h))
+        return best[1] if best else None
+
+    def _prepare(self, haystack, needle, grayscale):
+        if grayscale:
+            return to_gray_array(haystack), to_gray_array(needle)
+        return to_bgr_array(haystack), to_bgr_array(needle)
+
+    def _match_full(self, haystack, needle, confidence):
+        result = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score >= confidence:
+            return Box(x, y, needle.shape[1], needle.shape[0])
+        return None
+
+    def _coarse_candidates(self, haystack, needle, threshold):
+        """Pick the strongest coarse peaks, suppressing their neighbourhoods"""
+        result = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+        needle_h, needle_w = needle.shape[:2]
+        candidates = []
+        for _ in range(self.max_candidates):
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            if score < threshold:
+                break
+            candidates.append((x, y))
+            result[max(0, y - needle_h // 2):y + needle_h // 2 + 1,
+                   max(0, x - needle_w // 2):x + needle_w // 2 + 1] = -1.0
+        return candidates
+
+
+class CoherentLocator:
+    """Search where each reference was last found before scanning the screen.
+
+    UI elements rarely move between runs, so the previous hit rectangle is
+    grown by ``expand`` pixels on every side and searched first. Only a miss
+    there pays for a full-screen search. Statistics are kept per key (one
+    key per macro step or element) so the saved search area can be checked.
+    """
+
+    def __init__(self, matcher=None, expand=64):
+        self.matcher = matcher or PyramidMatcher()
+        self.expand = expand
+        self.last_hits = {}
+        self._stats = {}
+
+    def locate(self, key, haystack, needle, confidence=0.9, grayscale=False):
+        """Return the Box for needle, trying the last known location first"""
+        if grayscale:
+            haystack = to_gray_array(haystack)
+        else:
+            haystack = to_bgr_array(haystack)
+        stats = self._stats.setdefault(key, {
+            'hits': 0, 'fallbacks': 0, 'misses': 0,
+            'searched_pixels': 0, 'full_pixels': 0
+        })
+        full_pixels = haystack.shape[0] * haystack.shape[1]
+        stats['full_pixels'] += full_pixels
+
+        last = self.last_hits.get(key)
+        if last is not None:
+            left = max(0, last.left - self.expand)
+            top = max(0, last.top - self.expand)
+            right = min(haystack.shape[1], last.left + last.width + self.expand)
+            bottom = min(haystack.shape[0], last.top + last.height + self.expand)
+            window = haystack[top:bottom, left:right]
+            stats['searched_pixels'] += window.shape[0] * window.shape[1]
+            box = self.matcher.locate(window, needle, confidence, grayscale)
+            if box is not None:
+                stats['hits'] += 1
+                box = Box(left + box.left, top + box.top, box.width, box.height)
+                self.last_hits[key] = box
+                return box
+            stats['fallbacks'] += 1
+
+        stats['searched_pixels'] += full_pixels
+        box = self.matcher.locate(haystack, needle, confidence, grayscale)
+        if box is None:
+            stats['misses'] += 1
+            self.last_hits.pop(key, None)
+        else:
+            self.last_hits[key] = box
+        return box
+
+    def forget(self, key=None):
+        """Drop the remembered location for key, or for every key"""
+        if key is None:
+            self.last_hits.clear()
+        else:
+            self.last_hits.pop(key, None)
+
+    def stats(self, key=None):
+        """Per-key hit/fallback counters plus the fraction of area not searched"""
+        keys = [key] if key is not None else list(self._stats)
+        report = {}
+        for k in keys:
+            stats = dict(self._stats.get(k, {}))
+            if stats.get('full_pixels'):
+                stats['area_saved'] = 1.0 - stats['searched_pixels'] / stats['full_pixels']
+            report[k] = stats
+        return report[key] if key is not None else report
+
+    def area_saved(self):
+        """Fraction of screen area skipped across every key"""
+        searched = sum(s['searched_pixels'] for s in self._stats.values())
+        full = sum(s['full_pixels'] for s in self._stats.values())
+        return 1.0 - searched / full if full else 0.0
+
+
+class BatchLocator:
+    """Match many templates against a single screen grab.
+
+    The frame is converted once and the templates are matched concurrently
+    on a thread pool; OpenCV releases the GIL inside matchTemplate so the
+    work spreads across cores. Each template goes through the coherent
+    locator, keyed by the name it was passed in with.
+    """
+
+    def __init__(self, locator=None, max_workers=None):
+        self.locator = locator or CoherentLocator()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count())
+
+    def locate_all(self, haystack, needles, confidence=0.9, grayscale=False):
+        """Return {name: Box or None} for a {name: template} mapping"""
+        if grayscale:
+            frame = to_gray_array(haystack)
+        else:
+            frame = to_bgr_array(haystack)
+        futures = {
+            name: self.executor.submit(self.locator.locate, name, frame,
+                                       needle, confidence, grayscale)
+            for name, needle in needles.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
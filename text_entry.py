@@ -0,0 +1,191 @@
+import string
+import sys
+import time
+
+# Characters every input backend can type as key presses
+TYPEABLE = set(string.printable) - {'\r', '\x0b', '\x0c'}
+
+STRATEGIES = ('auto', 'keys', 'chunked', 'clipboard')
+
+_PASTE_MODIFIER = 'command' if sys.platform == 'darwin' else 'ctrl'
+
+
+class TypeResult:
+    """How a piece of text was entered and how fast"""
+
+    def __init__(self, strategy, chars, seconds, verified=None):
+        self.strategy = strategy
+        self.chars = chars
+        self.seconds = seconds
+        self.verified = verified
+
+    @property
+    def chars_per_second(self):
+        return self.chars / self.seconds if self.seconds else float('inf')
+
+    def summary(self):
+        text = (f"{self.chars} chars via {self.strategy} in {self.seconds:.3f}s "
+                f"({self.chars_per_second:,.0f} chars/s)")
+        if self.verified is not None:
+            text += ", verified" if self.verified else ", verification failed"
+        return text
+
+
+class Clipboard:
+    """Text clipboard access through pyperclip, which pyautogui installs"""
+
+    def __init__(self):
+        import pyperclip
+        self.pyperclip = pyperclip
+
+    def get(self):
+        try:
+            return self.pyperclip.paste()
+        except self.pyperclip.PyperclipException:
+            return None
+
+    def set(self, text):
+        self.pyperclip.copy(text)
+
+    def available(self):
+        """True when the system clipboard really works (xclip/xsel on Linux)"""
+        try:
+            self.pyperclip.paste()
+        except self.pyperclip.PyperclipException:
+            return False
+        return True
+
+
+class TextEntryEngine:
+    """Enters text through an input backend using the cheapest safe strategy.
+
+    "keys" sends the text as one batch of key presses, "chunked" sends it in
+    ``chunk_size`` pieces with a flush (and ``chunk_pause``) between them so
+    the target keeps up, and "clipboard" pastes it with the previous
+    clipboard text restored afterwards. "auto" picks keys up to
+    ``key_threshold`` characters, the clipboard from ``clipboard_threshold``
+    characters or for text a keyboard cannot type, and chunks in between.
+
+    ``verify(text)`` is called after entry and must return True when the
+    target holds the text; a False result raises.
+    """
+
+    def __init__(self, input, clipboard=None, key_threshold=32, chunk_size=64,
+                 chunk_pause=0.0, clipboard_threshold=256, paste_settle=0.05,
+                 verify=None):
+        self.input = input
+        self._clipboard = clipboard
+        self.key_threshold = key_threshold
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.clipboard_threshold = clipboard_threshold
+        self.paste_settle = paste_settle
+        self.verify = verify
+        self._clipboard_ok = None
+
+    @property
+    def clipboard(self):
+        if self._clipboard is None:
+            self._clipboard = Clipboard()
+        return self._clipboard
+
+    def choose(self, text):
+        """Strategy "auto" resolves to for this text"""
+        if not set(text) <= TYPEABLE:
+            return 'clipboard'
+        if len(text) <= self.key_threshold:
+            return 'keys'
+        if len(text) >= self.clipboard_threshold:
+            return 'clipboard'
+        return 'chunked'
+
+    def type(self, text, strategy='auto'):
+        """Enter text and return a TypeResult"""
+        if strategy not in STRATEGIES:
+            raise Exception(f"Unknown text entry strategy: {strategy}")
+        if strategy == 'auto':
+            strategy = self.choose(text)
+            if strategy == 'clipboard' and not self._clipboard_available():
+                if not set(text) <= TYPEABLE:
+                    raise Exception("Text has characters that need the clipboard, "
+                                    "but no clipboard is available")
+                strategy = 'chunked'
+
+        start = time.perf_counter()
+        if strategy == 'keys':
+            self.input.write(text)
+            self.input.flush()
+        elif strategy == 'chunked':
+            self._type_chunked(text)
+        else:
+            self._paste(text)
+        result = TypeResult(strategy, len(text), time.perf_counter() - start)
+
+        if self.verify is not None:
+            result.verified = bool(self.verify(text))
+            if not result.verified:
+                raise Exception(f"Typed text did not verify ({result.summary()})")
+        return result
+
+    def copy(self):
+        """Copy the target's selection to the clipboard"""
+        self.input.hotkey(_PASTE_MODIFIER, 'c')
+        self.input.flush()
+
+    def paste(self, text=None):
+        """Paste text (restoring the clipboard), or whatever the clipboard holds"""
+        if text:
+            return self.type(text, 'clipboard')
+        self.input.hotkey(_PASTE_MODIFIER, 'v')
+        self.input.flush()
+        return None
+
+    def _type_chunked(self, text):
+        for offset in range(0, len(text), self.chunk_size):
+            self.input.write(text[offset:offset + self.chunk_size])
+            self.input.flush()
+            if self.chunk_pause:
+                time.sleep(self.chunk_pause)
+
+    def _paste(self, text):
+        previous = self.clipboard.get()
+        self.clipboard.set(text)
+        try:
+            self.input.hotkey(_PASTE_MODIFIER, 'v')
+            self.input.flush()
+            # Give the target time to read the clipboard before it changes back
+            time.sleep(self.paste_settle)
+        finally:
+            if previous is not None:
+                self.clipboard.set(previous)
+
+    def _clipboard_available(self):
+        """Probe the clipboard once; pyperclip imports fine without a backend"""
+        if self._clipboard_ok is None:
+            try:
+                self._clipboard_ok = self.clipboard.available()
+            except ImportError:
+                self._clipboard_ok = False
+        return self._clipboard_ok
+
+
+def select_all_verifier(engine, settle=0.05):
+    """verify hook that copies the focused field and compares it to the text.
+
+    Selects everything in the field with Ctrl+A (Cmd+A on macOS), copies it
+    and collapses the selection again with Right, so only use it on fields
+    where that is harmless. The clipboard is restored afterwards.
+    """
+    def verify(text):
+        previous = engine.clipboard.get()
+        try:
+            engine.input.hotkey(_PASTE_MODIFIER, 'a')
+            engine.input.hotkey(_PASTE_MODIFIER, 'c')
+            engine.input.press('right')
+            engine.input.flush()
+            time.sleep(settle)
+            return engine.clipboard.get() == text
+        finally:
+            if previous is not None:
+                engine.clipboard.set(previous)
+    return verify
@@ -0,0 +1,245 @@
+import collections
+import time
+
+import cv2
+import numpy as np
+
+from template_matcher import Box, PyramidMatcher
+from wait_engine import WaitResult, frame_signature
+
+
+class VideoKeyframes:
+    """The distinct frames of a reference clip, in playback order"""
+    __slots__ = ('path', 'mtime', 'frames', 'gray', 'flat', 'positions', 'fps', 'nbytes')
+
+    def __init__(self, path, mtime, frames, positions, fps):
+        self.path = path
+        self.mtime = mtime
+        self.frames = frames
+        self.gray = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+        # Correlation is undefined on a single-color frame, see _similarity
+        self.flat = [gray.std() < 1.0 for gray in self.gray]
+        self.positions = positions
+        self.fps = fps
+        self.nbytes = sum(f.nbytes for f in frames) + sum(g.nbytes for g in self.gray)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def size(self):
+        """(width, height) of the clip in pixels"""
+        return self.frames[0].shape[1], self.frames[0].shape[0]
+
+
+def load_keyframes(path, mtime=None, threshold=12, max_keyframes=24):
+    """Decode a clip and keep only the frames where its content changes.
+
+    A frame becomes a keyframe when some cell of its thumbnail signature
+    differs from the previous keyframe by more than ``threshold``. The final
+    frame always ends the list, since that is the state a wait is after.
+    Long clips are thinned evenly down to ``max_keyframes``. The signature
+    matches ``ReferenceStore.get``'s loader interface so keyframes can share
+    the reference cache.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise Exception(f"Could not open reference video: {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frames, positions = [], []
+    previous = last = None
+    position = -1
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            position += 1
+            last = frame
+            signature = frame_signature(frame)
+            if previous is None or np.abs(signature - previous).max() > threshold:
+                frames.append(frame)
+                positions.append(position)
+                previous = signature
+    finally:
+        capture.release()
+    if not frames:
+        raise Exception(f"Reference video has no frames: {path}")
+
+    if positions[-1] != position:
+        if len(frames) > 1:
+            # The tail looks like the last keyframe, so let it stand in for it
+            frames[-1], positions[-1] = last, position
+        else:
+            frames.append(last)
+            positions.append(position)
+    if len(frames) > max_keyframes:
+        keep = np.unique(np.linspace(0, len(frames) - 1, max_keyframes).round().astype(int))
+        frames = [frames[i] for i in keep]
+        positions = [positions[i] for i in keep]
+    return VideoKeyframes(path, mtime, frames, positions, fps)
+
+
+def _similarity(patch, keyframes, index):
+    key = keyframes.gray[index]
+    if patch.shape != key.shape:
+        patch = cv2.resize(patch, (key.shape[1], key.shape[0]))
+    if keyframes.flat[index] or patch.std() < 1.0:
+        return 1.0 - float(cv2.absdiff(patch, key).mean()) / 255.0
+    return float(cv2.matchTemplate(patch, key, cv2.TM_CCOEFF_NORMED)[0, 0])
+
+
+class SequenceTracker:
+    """Sliding window over the keyframes the most recent screen frames matched.
+
+    ``update`` takes the keyframe index the newest frame matched, or None.
+    Repeats of the same index are collapsed, so a slow animation sampled
+    many times per keyframe still fits in the window. The clip counts as
+    played through once the newest match is the final keyframe, the
+    matches in the window never step backwards, and at least
+    ``min_keyframes`` distinct keyframes were seen among them. That
+    defaults to three (or every keyframe of shorter clips), so seeing only
+    the final keyframe does not count as the clip having played; pass 1 to
+    accept the final keyframe on its own, like Wait for Image.
+
+    An animation that ended before the wait started, or whose middle
+    keyframes were missed, still counts once the final keyframe has
+    matched ``settle_polls`` updates in a row; 0 turns that off.
+    """
+
+    DEFAULT_MIN_KEYFRAMES = 3
+    DEFAULT_SETTLE_POLLS = 3
+
+    def __init__(self, count, window=8, min_keyframes=None, settle_polls=None):
+        self.count = count
+        self.recent = collections.deque(maxlen=window)
+        if min_keyframes is None:
+            min_keyframes = self.DEFAULT_MIN_KEYFRAMES
+        self.min_keyframes = max(1, min(min_keyframes, count, window))
+        if settle_polls is None:
+            settle_polls = self.DEFAULT_SETTLE_POLLS
+        self.settle_polls = settle_polls
+        self.final_polls = 0
+
+    def update(self, index):
+        if not self.recent or self.recent[-1] != index:
+            self.recent.append(index)
+        self.final_polls = self.final_polls + 1 if index == self.count - 1 else 0
+        return self.finished
+
+    def reset(self):
+        self.recent.clear()
+        self.final_polls = 0
+
+    @property
+    def finished(self):
+        if self.settle_polls and self.final_polls >= self.settle_polls:
+            return True
+        seen = [index for index in self.recent if index is not None]
+        if not seen or seen[-1] != self.count - 1:
+            return False
+        if any(later < earlier for earlier, later in zip(seen, seen[1:])):
+            return False
+        return len(set(seen)) >= self.min_keyframes
+
+
+class VideoMatcher:
+    """Follows a reference clip on the live screen.
+
+    The clip is anchored once by locating any of its keyframes with the
+    template matcher, trying the final one first. After that each poll
+    only compares the anchored box against the keyframes, so following
+    an animation costs a handful of small correlations per frame.
+    """
+
+    def __init__(self, keyframes, confidence=0.9, matcher=None):
+        self.keyframes = keyframes
+        self.confidence = confidence
+        self.matcher = matcher or PyramidMatcher()
+
+    def anchor(self, frame):
+        """Return (Box, keyframe index) of the clip found in frame, or None"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        for index in reversed(range(len(self.keyframes))):
+            box = self.matcher.locate(gray, self.keyframes.gray[index],
+                                      self.confidence, grayscale=True)
+            if box is not None:
+                # Neighbouring keyframes look alike, so pick the closest one
+                patch = gray[box.top:box.top + box.height, box.left:box.left + box.width]
+                return box, self.observe(patch)
+        return None
+
+    def observe(self, patch):
+        """Return the index of the keyframe patch shows, or None"""
+        if patch.ndim == 3:
+            patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+        best, best_score = None, self.confidence
+        for index in range(len(self.keyframes)):
+            score = _similarity(patch, self.keyframes, index)
+            if score >= best_score:
+                best, best_score = index, score
+        return best
+
+
+def wait_for_video(screen, keyframes, timeout=10.0, confidence=0.9, region=None,
+                   matcher=None, window=8, min_keyframes=None, settle_polls=None,
+                   interval=None):
+    """Block until the screen has played through the reference clip.
+
+    Use it in place of a fixed Wait after starting an animation, a progress
+    bar or a transition: it returns as soon as the clip's final keyframe
+    shows up after the earlier ones, or has stayed on screen for a few
+    polls, see SequenceTracker. ``region`` is
+    (left, top, right, bottom) in screen coordinates and limits where the
+    clip is anchored; the poll rate defaults to the clip's frame rate.
+    """
+    video = VideoMatcher(keyframes, confidence, matcher)
+    tracker = SequenceTracker(len(keyframes), window, min_keyframes, settle_polls)
+    if interval is None:
+        interval = min(0.1, max(0.02, 1.0 / keyframes.fps))
+    offset = region[:2] if region is not None else (0, 0)
+    start = time.monotonic()
+    cpu_start = time.thread_time()
+    deadline = start + timeout
+    polls = matches = misses = 0
+    box = previous = index = location = None
+
+    while True:
+        polls += 1
+        if box is None:
+            screen.invalidate()
+            matches += 1
+            found = video.anchor(screen.grab(region))
+            if found is not None:
+                found_box, index = found
+                box = Box(found_box.left + offset[0], found_box.top + offset[1],
+                          found_box.width, found_box.height)
+                previous = None
+                tracker.reset()
+                tracker.update(index)
+        else:
+            patch = screen.grab_region((box.left, box.top,
+                                        box.left + box.width, box.top + box.height))
+            signature = frame_signature(patch)
+            if (previous is None or signature.shape != previous.shape or
+                    np.abs(signature - previous).max() > 3):
+                previous = signature
+                matches += 1
+                index = video.observe(patch)
+            tracker.update(index)
+            misses = misses + 1 if index is None else 0
+            if misses >= tracker.recent.maxlen:
+                # The clip is not where it was anchored any more
+                box = None
+                misses = 0
+
+        if tracker.finished:
+            location = box
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+
+    return WaitResult(location, time.monotonic() - start,
+                      time.thread_time() - cpu_start, polls, matches)
@@ -0,0 +1,164 @@
+import collections
+import threading
+import time
+
+import cv2
+
+
+class VideoRecorder:
+    """Records a screen region to a video file in the background.
+
+    A capture thread grabs the region at ``fps`` and pushes frames into a
+    bounded queue; an encoder thread pops them and writes the file. The
+    grabber never waits for the encoder: once ``queue_size`` frames are
+    pending, ``drop_policy`` decides whether the oldest queued frame
+    ("oldest") or the new one ("newest") is thrown away. Frames are
+    stamped when they are grabbed so ``stats()`` can report how long each
+    one waited before it reached the file.
+    """
+
+    def __init__(self, screen, path, region, fps=30.0, queue_size=60,
+                 drop_policy='oldest', fourcc='mp4v'):
+        if drop_policy not in ('oldest', 'newest'):
+            raise Exception(f"Unknown drop policy: {drop_policy}")
+        left, top, right, bottom = region
+        self.screen = screen
+        self.path = path
+        self.region = (left, top, right, bottom)
+        self.size = (right - left, bottom - top)
+        self.fps = fps
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.fourcc = fourcc
+
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.late = 0
+        self.error = None
+        self.started = None
+        self.stopped = None
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+        self._queue = collections.deque()
+        self._ready = threading.Condition()
+        self._running = threading.Event()
+        self._capture_thread = None
+        self._encoder_thread = None
+        self._writer = None
+
+    @property
+    def recording(self):
+        return self._running.is_set()
+
+    def start(self):
+        """Open the output file and start the capture and encoder threads"""
+        if self.recording:
+            return
+        self._writer = cv2.VideoWriter(
+            self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+        if not self._writer.isOpened():
+            self._writer = None
+            raise Exception(f"Could not open video file for writing: {self.path}")
+        self.started = time.monotonic()
+        self.stopped = None
+        self._running.set()
+        self._encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._encoder_thread.start()
+        self._capture_thread.start()
+
+    def stop(self):
+        """Stop grabbing, write out the queued frames and close the file"""
+        if not self.recording:
+            return self.stats()
+        self._running.clear()
+        self._capture_thread.join()
+        with self._ready:
+            self._ready.notify()
+        self._encoder_thread.join()
+        self.stopped = time.monotonic()
+        return self.stats()
+
+    def stats(self):
+        """Frame counters, achieved frame rates and encode latency"""
+        end = self.stopped or time.monotonic()
+        elapsed = end - self.started if self.started else 0.0
+        return {
+            'target_fps': self.fps,
+            'capture_fps': self.captured / elapsed if elapsed else 0.0,
+            'written_fps': self.written / elapsed if elapsed else 0.0,
+            'captured': self.captured,
+            'written': self.written,
+            'dropped': self.dropped,
+            'late_ticks': self.late,
+            'queued': len(self._queue),
+            'latency_avg': self._latency_total / self.written if self.written else 0.0,
+            'latency_max': self._latency_max,
+            'duration': elapsed,
+            'error': self.error,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"{stats['written']} frames in {stats['duration']:.1f}s "
+                f"({stats['capture_fps']:.1f} fps captured, {stats['dropped']} dropped, "
+                f"{stats['latency_avg'] * 1000:.0f} ms avg encode latency)")
+
+    def _capture_loop(self):
+        interval = 1.0 / self.fps
+        next_tick = time.monotonic()
+        while self._running.is_set():
+            try:
+                frame = self.screen.grab_region(self.region)
+            except Exception as e:
+                self.error = f"Capture failed: {e}"
+                self._running.clear()
+                break
+            self._push(frame, time.monotonic())
+
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # A slow grab should not cause a burst of catch-up frames
+                self.late += 1
+                next_tick = time.monotonic()
+
+    def _push(self, frame, stamp):
+        with self._ready:
+            self.captured += 1
+            if len(self._queue) >= self.queue_size:
+                self.dropped += 1
+                if self.drop_policy == 'newest':
+                    return
+                self._queue.popleft()
+            self._queue.append((frame, stamp))
+            self._ready.notify()
+
+    def _encode_loop(self):
+        width, height = self.size
+        try:
+            while True:
+                with self._ready:
+                    while not self._queue and self._running.is_set():
+                        self._ready.wait(0.1)
+                    if not self._queue:
+                        break
+                    frame, stamp = self._queue.popleft()
+                # Regions near the screen edge come back cropped
+                if frame.shape[0] != height or frame.shape[1] != width:
+                    frame = cv2.resize(frame, (width, height))
+                self._writer.write(frame)
+                latency = time.monotonic() - stamp
+                self.written += 1
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+        except Exception as e:
+            self.error = f"Encoding failed: {e}"
+            self._running.clear()
+        finally:
+            self._writer.release()
+            self._writer = None
@@ -0,0 +1,90 @@
+import time
+
+import cv2
+import numpy as np
+
+from template_matcher import Box, PyramidMatcher
+
+
+class WaitResult:
+    """Outcome of a wait: where the image appeared and what it cost"""
+
+    def __init__(self, location, latency, cpu_time, polls, matches):
+        self.location = location
+        self.latency = latency
+        self.cpu_time = cpu_time
+        self.polls = polls
+        self.matches = matches
+
+    @property
+    def found(self):
+        return self.location is not None
+
+    @property
+    def cpu_percent(self):
+        """Share of one core used while waiting"""
+        return 100.0 * self.cpu_time / self.latency if self.latency else 0.0
+
+    def summary(self):
+        outcome = "found" if self.found else "timed out"
+        return (f"{outcome} after {self.latency:.2f}s, {self.polls} polls, "
+                f"{self.matches} matches, {self.cpu_percent:.1f}% CPU")
+
+
+def frame_signature(frame, cell=16):
+    """Grayscale thumbnail with one pixel per cell x cell block of the frame"""
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    height, width = frame.shape[:2]
+    size = (max(1, -(-width // cell)), max(1, -(-height // cell)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def wait_for_image(screen, template, timeout=10.0, confidence=0.9, region=None,
+                   matcher=None, min_interval=0.05, max_interval=1.0,
+                   backoff=1.5, diff_threshold=3):
+    """Block until template appears on screen or timeout expires.
+
+    Every poll only builds a thumbnail signature of the watched region;
+    template matching reruns when the absolute difference from the
+    last matched signature exceeds ``diff_threshold`` in any cell, so even
+    a small icon appearing triggers a match. While the screen
+    stays still the poll interval grows by ``backoff`` up to
+    ``max_interval``, and it drops back to ``min_interval`` when pixels
+    change. ``region`` is (left, top, right, bottom) in screen coordinates.
+    """
+    matcher = matcher or PyramidMatcher()
+    start = time.monotonic()
+    cpu_start = time.thread_time()
+    deadline = start + timeout
+    interval = min_interval
+    previous = None
+    polls = matches = 0
+    location = None
+
+    while True:
+        polls += 1
+        screen.invalidate()
+        frame = screen.grab(region)
+        signature = frame_signature(frame)
+        if (previous is None or signature.shape != previous.shape or
+                np.abs(signature - previous).max() > diff_threshold):
+            previous = signature
+            matches += 1
+            location = matcher.locate(frame, template, confidence)
+            if location is not None:
+                if region is not None:
+                    location = Box(location.left + region[0], location.top + region[1],
+                                   location.width, location.height)
+                break
+            interval = min_interval
+        else:
+            interval = min(interval * backoff, max_interval)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+
+    return WaitResult(location, time.monotonic() - start,
+                      time.thread_time() - cpu_start, polls, matches)
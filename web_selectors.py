@@ -0,0 +1,207 @@
+import collections
+import time
+
+from template_matcher import Box
+
+# Action name -> (selector kind, parameter holding the selector)
+SELECTOR_ACTIONS = {
+    "CSS Selector Click": ("css", "selector"),
+    "XPath Click": ("xpath", "xpath"),
+}
+
+# Actions that need a browser
+WEB_ACTIONS = ("Open Website", "Custom JavaScript") + tuple(SELECTOR_ACTIONS)
+
+# Resolves a list of [kind, selector] pairs in one round trip. The first
+# call on a document installs a MutationObserver that bumps an epoch on
+# every change; when the caller's token and epoch still match, nothing is
+# resolved and only [token, epoch, null] comes back.
+_RESOLVE_SCRIPT = """
+var token = arguments[0], epoch = arguments[1], targets = arguments[2];
+var state = window.__macroflowDom;
+if (!state) {
+  state = {token: Date.now().toString(36) + Math.random().toString(36).slice(2), epoch: 0};
+  new MutationObserver(function () { state.epoch += 1; }).observe(document, {
+    childList: true, subtree: true, attributes: true, characterData: true});
+  window.__macroflowDom = state;
+}
+if (state.token === token && state.epoch === epoch) {
+  return [state.token, state.epoch, null];
+}
+var results = [];
+for (var i = 0; i < targets.length; i++) {
+  var kind = targets[i][0], selector = targets[i][1], element = null;
+  try {
+    if (kind === 'xpath') {
+      element = document.evaluate(selector, document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    } else {
+      element = document.querySelector(selector);
+    }
+  } catch (e) {
+    results.push([null, null, false, String(e.message || e)]);
+    continue;
+  }
+  if (!element) {
+    results.push([null, null, false, null]);
+  } else if (element.nodeType !== 1) {
+    results.push([null, null, false, 'does not select an element']);
+  } else {
+    var rect = element.getBoundingClientRect();
+    var style = window.getComputedStyle(element);
+    var clickable = rect.width > 0 && rect.height > 0 && !element.disabled &&
+      style.visibility !== 'hidden' && style.display !== 'none' &&
+      style.pointerEvents !== 'none';
+    results.push([element, [rect.left, rect.top, rect.width, rect.height], clickable, null]);
+  }
+}
+return [state.token, state.epoch, results];
+"""
+
+# One resolved selector; box is in viewport CSS pixels
+ResolvedElement = collections.namedtuple('ResolvedElement', 'element box clickable error')
+
+
+class SelectorResolver:
+    """Resolves CSS/XPath selectors in batches and caches the elements.
+
+    ``prefetch`` looks up every selector of a run of web steps with one
+    execute_script call, returning the element handles and bounding boxes
+    together. The results stay valid until the page's DOM changes: each
+    later lookup sends the token and epoch the cache was built at, and the
+    page only resolves the selectors again when its MutationObserver has
+    counted a change or the document was replaced. Selectors that were
+    missing or not clickable are always resolved again, since visibility
+    can change without a DOM mutation.
+    """
+
+    def __init__(self, driver, poll=0.1):
+        self.driver = driver
+        self.poll = poll
+        self.scripts = 0
+        self.resolved = 0
+        self.cached = 0
+        self._token = None
+        self._epoch = None
+        self._cache = {}
+        self._queued = []
+        self._fresh = False
+
+    def prefetch(self, targets):
+        """Resolve a list of (kind, selector) pairs in one round trip"""
+        self._queued = list(dict.fromkeys(targets))
+        self._run(self._queued, force=True)
+
+    def resolve(self, kind, selector):
+        """Return the cached ResolvedElement, checking the epoch first"""
+        target = (kind, selector)
+        if target in self._queued:
+            self._queued.remove(target)
+        entry = self._cache.get(target)
+        if entry is None or not entry.clickable:
+            self._run([target], force=True)
+        elif not self._fresh:
+            # If the page changed, the rest of the prefetched run is resolved
+            # again in the same call, so every step stays one round trip
+            self._run([target] + self._queued, force=False)
+        else:
+            self.cached += 1
+        self._fresh = False
+        return self._cache[target]
+
+    def wait_clickable(self, kind, selector, timeout):
+        """Poll until the selector matches a clickable element"""
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = self.resolve(kind, selector)
+            if entry.error:
+                raise Exception(f"Invalid {kind} selector {selector!r}: {entry.error}")
+            if entry.clickable:
+                return entry
+            if time.monotonic() >= deadline:
+                state = "not clickable" if entry.element is not None else "not found"
+                raise Exception(f"Element {selector!r} {state} after {timeout:.3g}s")
+            time.sleep(self.poll)
+
+    def click(self, kind, selector, timeout):
+        """Click the element a selector resolves to, waiting up to timeout"""
+        from selenium.common.exceptions import (
+            ElementClickInterceptedException, ElementNotInteractableException,
+            StaleElementReferenceException)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = self.wait_clickable(kind, selector, max(0.0, deadline - time.monotonic()))
+            try:
+                entry.element.click()
+                return entry
+            except (StaleElementReferenceException, ElementClickInterceptedException,
+                    ElementNotInteractableException):
+                self._cache.pop((kind, selector), None)
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(self.poll)
+
+    def invalidate(self):
+        self._token = self._epoch = None
+        self._cache.clear()
+        self._queued = []
+        self._fresh = False
+
+    def stats(self):
+        return {'scripts': self.scripts, 'resolved': self.resolved,
+                'cached': self.cached}
+
+    def _run(self, targets, force):
+        token, epoch = (None, None) if force else (self._token, self._epoch)
+        self.scripts += 1
+        token, epoch, results = self.driver.execute_script(
+            _RESOLVE_SCRIPT, token, epoch, [list(t) for t in targets])
+        if results is None:
+            self.cached += 1
+            return
+        if token != self._token or epoch != self._epoch:
+            # Anything not in this batch was resolved against an older DOM
+            self._cache.clear()
+        self._token, self._epoch = token, epoch
+        for target, (element, box, clickable, error) in zip(targets, results):
+            self._cache[target] = ResolvedElement(
+                element, Box(*box) if box else None, bool(clickable), error)
+        self.resolved += len(targets)
+        self._fresh = True
+
+
+def web_target(step, name):
+    """The step's selector/script parameter, else its CSS/HTML reference file"""
+    if step.params[name]:
+        return step.params[name]
+    if isinstance(step.reference, str):
+        with open(step.reference, 'r') as f:
+            return f.read().strip()
+    raise Exception(f"{step.action} needs a {name} or a CSS/HTML reference")
+
+
+def step_selector(step):
+    """(kind, selector) for a CSS Selector Click or XPath Click step"""
+    kind, name = SELECTOR_ACTIONS[step.action]
+    return kind, web_target(step, name)
+
+
+def selector_runs(steps, limit=32):
+    """Yield (step, run) pairs; run lists the consecutive selector steps
+    starting at step, at most ``limit`` of them, and is None elsewhere"""
+    run = []
+    for step in steps:
+        if run and (step.action not in SELECTOR_ACTIONS or len(run) == limit):
+            yield from _drain(run)
+            run = []
+        if step.action in SELECTOR_ACTIONS:
+            run.append(step)
+        else:
+            yield step, None
+    yield from _drain(run)
+
+
+def _drain(run):
+    for i, step in enumerate(run):
+        yield step, run if i == 0 else None
@@ -0,0 +1,230 @@
+import collections
+import contextlib
+import os
+import threading
+import time
+
+
+
+def create_webdriver(kind=None, headless=None):
+    """Start a WebDriver from a name or the MACROFLOW_WEBDRIVER variable.
+
+    Accepted values are "chrome" (the default), "firefox", "edge" and
+    "remote:<url>" (or a bare http:// URL) for a Selenium Grid node,
+    chromedriver started by hand or a stub endpoint. ``headless`` defaults
+    to the MACROFLOW_HEADLESS variable.
+    """
+    from selenium import webdriver
+
+    kind = kind or os.environ.get('MACROFLOW_WEBDRIVER', 'chrome')
+    if headless is None:
+        headless = os.environ.get('MACROFLOW_HEADLESS', '') not in ('', '0')
+    name, _, argument = kind.partition(':')
+    if kind.startswith(('http://', 'https://')):
+        name, argument = 'remote', kind
+    if name in ('remote', 'chrome'):
+        options = webdriver.ChromeOptions()
+    elif name == 'firefox':
+        options = webdriver.FirefoxOptions()
+    elif name == 'edge':
+        options = webdriver.EdgeOptions()
+    else:
+        raise Exception(f"Unknown WebDriver: {kind}")
+    if headless:
+        options.add_argument('--headless=new' if name != 'firefox' else '-headless')
+
+    if name == 'remote':
+        return webdriver.Remote(command_executor=argument, options=options)
+    if name == 'firefox':
+        return webdriver.Firefox(options=options)
+    if name == 'edge':
+        return webdriver.Edge(options=options)
+    return webdriver.Chrome(options=options)
+
+
+class WebSession:
+    """A pooled WebDriver plus the bookkeeping used to recycle it"""
+    __slots__ = ('driver', 'created', 'uses')
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created = time.monotonic()
+        self.uses = 0
+
+
+class WebSessionPool:
+    """Keeps warm browser sessions and hands one out per macro run.
+
+    At most ``max_sessions`` browsers exist at once; ``acquire`` waits for
+    a free one beyond that. Sessions are health-checked when handed out,
+    reset when given back, and replaced after ``max_uses`` runs or
+    ``max_age`` seconds. The reset clears cookies and storage for every
+    site through the Chrome DevTools protocol and closes extra windows;
+    browsers without it (Firefox) are recycled instead of reused, since
+    WebDriver alone can only clear the current origin. ``prewarm`` starts
+    browsers in the background so the first macro does not wait for one.
+    ``factory`` returns a new WebDriver and defaults to create_webdriver.
+    """
+
+    def __init__(self, factory=None, max_sessions=2, warm=1, max_uses=50,
+                 max_age=1800.0):
+        self.factory = factory or create_webdriver
+        self.max_sessions = max_sessions
+        self.warm = warm
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+        self.failed_checks = 0
+        self._idle = collections.deque()
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def prewarm(self, count=None):
+        """Start up to ``count`` (default ``warm``) idle sessions in the background"""
+        threads = []
+        with self._cond:
+            count = min(self.warm if count is None else count,
+                        self.max_sessions - self._total)
+            self._total += max(0, count)
+        for _ in range(max(0, count)):
+            thread = threading.Thread(target=self._warm_one, daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def acquire(self, timeout=60.0):
+        """Return a healthy WebSession, starting a browser only if none is idle"""
+        deadline = time.monotonic() + timeout
+        while True:
+            session = None
+            with self._cond:
+                while not self._idle and self._total >= self.max_sessions:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        raise Exception("No browser session became free in time")
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise Exception("Browser session pool is closed")
+                if self._idle:
+                    session = self._idle.popleft()
+                else:
+                    self._total += 1
+
+            if session is None:
+                session = self._start()
+            elif not self._healthy(session):
+                with self._cond:
+                    self.failed_checks += 1
+                self._discard(session)
+                continue
+            else:
+                with self._cond:
+                    self.reused += 1
+            session.uses += 1
+            return session
+
+    def release(self, session, broken=False):
+        """Give a session back; it is reset for the next macro or recycled"""
+        expired = (session.uses >= self.max_uses or
+                   time.monotonic() - session.created >= self.max_age)
+        if broken or expired or self._closed or not self._reset(session):
+            if expired and not broken:
+                with self._cond:
+                    self.recycled += 1
+            self._discard(session)
+            return
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def session(self, timeout=60.0):
+        """``with pool.session() as driver:`` for one macro run"""
+        session = self.acquire(timeout)
+        broken = False
+        try:
+            yield session.driver
+        except Exception:
+            broken = not self._healthy(session)
+            raise
+        finally:
+            self.release(session, broken)
+
+    def close(self):
+        """Quit every idle browser; sessions in use are quit when released"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), collections.deque()
+            self._cond.notify_all()
+        for session in idle:
+            self._discard(session)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'sessions': self._total,
+                'idle': len(self._idle),
+                'created': self.created,
+                'reused': self.reused,
+                'recycled': self.recycled,
+                'failed_checks': self.failed_checks,
+            }
+
+    def _start(self):
+        try:
+            session = WebSession(self.factory())
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return session
+
+    def _warm_one(self):
+        try:
+            session = self._start()
+        except Exception:
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append(session)
+                self._cond.notify()
+                return
+        self._discard(session)
+
+    def _healthy(self, session):
+        try:
+            return session.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def _reset(self, session):
+        """Clear browser-wide state; False means the session must be recycled"""
+        driver = session.driver
+        try:
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin',
+                                   {'origin': '*', 'storageTypes': 'all'})
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.get('about:blank')
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, session):
+        try:
+            session.driver.quit()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()